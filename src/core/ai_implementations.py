@@ -1,26 +1,25 @@
-import requests
-import json
 import os
-from typing import List
+import re
+import orjson
+import threading
+from typing import Iterator, List, Optional
 from .interfaces import IKeywordExtractor, ISourceRecommender
+from .implementations import match_medical_keywords
+from .http_utils import create_session
+from . import llm_cache
+from .semantic_cache import SemanticCache
 
-class GeminiKeywordExtractor(IKeywordExtractor):
-    """AI-powered keyword extractor using Gemini API"""
-    
-    def __init__(self, api_key: str = None):
-        self.api_key = api_key or os.getenv('GEMINI_API_KEY')
-        self.base_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
-        
-        if not self.api_key:
-            raise ValueError("GEMINI_API_KEY environment variable is required")
-    
-    def extract_keywords(self, question: str) -> List[str]:
-        """Extract keywords using Gemini AI"""
-        
-        prompt = f"""
-You are a medical research expert. Analyze this research question and extract the most effective keywords for searching medical databases like PubMed.
+# Drug names by their stems (osimertinib, cetuximab, cisplatin); questions that
+# differ in these must not share cached keywords
+_DRUG_NAME_RE = re.compile(r'\b[a-z]+(?:tinib|mab|platin)\b')
+
+# Bump when prompts change so stale cached responses are not reused
+PROMPT_VERSION = "v2"
 
-Research Question: "{question}"
+# Static instructions sent as Gemini's systemInstruction, so every request shares
+# an identical prefix and only the short question/keyword part varies
+_KEYWORD_INSTRUCTIONS = """
+You are a medical research expert. Analyze the research question you are given and extract the most effective keywords for searching medical databases like PubMed.
 
 Instructions:
 1. Extract 5-8 specific medical keywords that would be most effective for database searching
@@ -33,31 +32,128 @@ Return ONLY a comma-separated list of keywords, nothing else.
 
 Example format: osimertinib, EGFR inhibitor, acute glomerulonephritis, nephrotoxicity, renal adverse effects
 """
-        
-        try:
-            response = self._call_gemini_api(prompt)
-            keywords_text = response.strip()
-            
-            # Parse comma-separated keywords
-            keywords = [k.strip() for k in keywords_text.split(',') if k.strip()]
-            
-            # Fallback if AI fails
-            if not keywords:
-                return self._fallback_keywords(question)
-                
-            return keywords
-            
-        except Exception as e:
-            print(f"AI keyword extraction failed: {e}")
-            return self._fallback_keywords(question)
+
+_SOURCE_INSTRUCTIONS = """
+You are a medical research librarian. Based on the keywords you are given, recommend the best 3-4 medical databases to search for research papers.
+
+Available databases:
+- PubMed (MEDLINE) - Primary medical literature
+- Embase - European medical database
+- Cochrane Library - Systematic reviews and clinical trials
+- Google Scholar - Broad academic search
+- Web of Science - Citation database
+- CINAHL - Nursing and allied health
+- Scopus - Scientific literature database
+
+Instructions:
+1. Choose 3-4 most relevant databases for these specific keywords
+2. Prioritize databases that would have the most relevant papers
+3. Consider the medical domain (oncology, nephrology, pharmacology)
+
+Return ONLY a comma-separated list of database names, nothing else.
+
+Example format: PubMed, Embase, Cochrane Library
+"""
+
+class _GeminiClient:
+    """Thin Gemini REST client shared by every AI component"""
     
-    def _call_gemini_api(self, prompt: str) -> str:
-        """Call Gemini API"""
+    # Shared keep-alive pool for every Gemini call
+    _SESSION = create_session()
+    
+    def __init__(self, api_key: str, base_url: str):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.stream_url = base_url.replace(':generateContent', ':streamGenerateContent') + '?alt=sse'
         
-        headers = {
+        # Only the API key varies between clients, so build headers once
+        self.headers = {
             'Content-Type': 'application/json',
-            'X-goog-api-key': self.api_key
+            'X-goog-api-key': api_key
         }
+    
+    def generate(self, prompt: str, generation_config: Optional[dict] = None,
+                 timeout: int = 30, prompt_version: str = PROMPT_VERSION,
+                 system_instruction: Optional[str] = None) -> str:
+        """Call Gemini API and return the response text"""
+        
+        cache_key = (system_instruction or "") + prompt
+        cached = llm_cache.get(cache_key, prompt_version)
+        if cached:
+            return cached
+        
+        response = self._SESSION.post(
+            self.base_url,
+            headers=self.headers,
+            data=self._build_payload(prompt, generation_config, system_instruction),
+            timeout=timeout
+        )
+        
+        if response.status_code != 200:
+            raise Exception(f"API call failed: {response.status_code} - {response.text}")
+        
+        # Decode straight from the body bytes; only the candidate text is kept
+        text = self._extract_text(orjson.loads(response.content))
+        llm_cache.set(cache_key, text, prompt_version)
+        
+        return text
+    
+    def stream(self, prompt: str, generation_config: Optional[dict] = None,
+               timeout: int = 60, prompt_version: str = PROMPT_VERSION) -> Iterator[str]:
+        """Stream Gemini output via streamGenerateContent, yielding text as it arrives"""
+        
+        cached = llm_cache.get(prompt, prompt_version)
+        if cached:
+            yield cached
+            return
+        
+        with self._SESSION.post(
+            self.stream_url,
+            headers=self.headers,
+            data=self._build_payload(prompt, generation_config),
+            timeout=timeout,
+            stream=True
+        ) as response:
+            if response.status_code != 200:
+                raise Exception(f"API call failed: {response.status_code} - {response.text}")
+            
+            chunks = []
+            finish_reason = None
+            try:
+                for line in response.iter_lines():
+                    # Server-sent events: each "data:" line carries one response chunk
+                    if not line.startswith(b'data:'):
+                        continue
+                    
+                    candidates = orjson.loads(line[5:]).get('candidates') or [{}]
+                    finish_reason = candidates[0].get('finishReason') or finish_reason
+                    parts = candidates[0].get('content', {}).get('parts', [])
+                    text = "".join(part.get('text', '') for part in parts)
+                    
+                    if text:
+                        chunks.append(text)
+                        yield text
+            except GeneratorExit:
+                # The caller stopped once it had enough; the same prompt only ever needs this much
+                if chunks:
+                    llm_cache.set(prompt, "".join(chunks), prompt_version)
+                raise
+        
+        if not chunks:
+            raise Exception("No response from AI")
+        
+        # Responses cut off by the token limit or a safety block are not worth keeping
+        if finish_reason == 'STOP':
+            llm_cache.set(prompt, "".join(chunks), prompt_version)
+    
+    def warm_up(self) -> None:
+        """Open a pooled connection with a free model-metadata request"""
+        model_url = self.base_url.rsplit(':', 1)[0]
+        self._SESSION.get(model_url, headers=self.headers, timeout=5)
+    
+    def _build_payload(self, prompt: str, generation_config: Optional[dict],
+                       system_instruction: Optional[str] = None) -> bytes:
+        """Build the JSON body for a Gemini generate call"""
         
         data = {
             "contents": [
@@ -71,36 +167,107 @@ Example format: osimertinib, EGFR inhibitor, acute glomerulonephritis, nephrotox
             ]
         }
         
-        response = requests.post(
-            self.base_url,
-            headers=headers,
-            json=data,
-            timeout=30
-        )
+        if system_instruction:
+            data["systemInstruction"] = {"parts": [{"text": system_instruction}]}
         
-        if response.status_code != 200:
-            raise Exception(f"API call failed: {response.status_code} - {response.text}")
+        if generation_config:
+            data["generationConfig"] = generation_config
         
-        result = response.json()
+        return orjson.dumps(data)
+    
+    def _extract_text(self, result: dict) -> str:
+        """Pull the generated text out of a Gemini response payload"""
         
         if 'candidates' not in result or not result['candidates']:
             raise Exception("No response from AI")
         
-        return result['candidates'][0]['content']['parts'][0]['text']
+        # Long answers can be split across several parts
+        parts = result['candidates'][0].get('content', {}).get('parts', [])
+        text = "".join(part.get('text', '') for part in parts)
+        
+        if not text:
+            raise Exception("Empty response from AI")
+        
+        return text
+
+class GeminiKeywordExtractor(IKeywordExtractor):
+    """AI-powered keyword extractor using Gemini API"""
     
-    def _fallback_keywords(self, question: str) -> List[str]:
-        """Fallback keyword extraction if AI fails"""
-        medical_keywords = [
-            "osimertinib", "EGFR inhibitor", "glomerulonephritis", 
-            "acute", "nephrotoxicity", "renal", "kidney"
-        ]
+    def __init__(self, api_key: str = None):
+        self.api_key = api_key or os.getenv('GEMINI_API_KEY')
+        self.base_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
         
-        found_keywords = []
-        question_lower = question.lower()
+        if not self.api_key:
+            raise ValueError("GEMINI_API_KEY environment variable is required")
+        
+        self._client = _GeminiClient(self.api_key, self.base_url)
+        
+        # Paraphrased questions reuse keywords extracted for an earlier question
+        self.semantic_cache = SemanticCache(
+            self.api_key,
+            os.path.join(llm_cache.CACHE_DIR, 'keywords_semantic.jsonl'),
+            _GeminiClient._SESSION
+        )
+        
+        # Per-thread record of whether the last answer was a fallback
+        self._local = threading.local()
+    
+    def used_fallback(self) -> bool:
+        """Whether this thread's last extract_keywords call fell back to the dictionary"""
+        return getattr(self._local, 'used_fallback', False)
+    
+    def extract_keywords(self, question: str) -> List[str]:
+        """Extract keywords using Gemini AI"""
+        
+        self._local.used_fallback = False
         
-        for keyword in medical_keywords:
-            if keyword.lower() in question_lower:
-                found_keywords.append(keyword)
+        # A similar question only counts if it names the same drugs and dictionary terms
+        terms = self._question_terms(question)
+        
+        try:
+            cached = self.semantic_cache.get(question)
+            if cached and cached['terms'] == terms:
+                return list(cached['keywords'])
+        except Exception as e:
+            print(f"Semantic cache lookup failed: {e}")
+        
+        prompt = f'Research Question: "{question}"'
+        
+        try:
+            response = self._call_gemini_api(prompt, _KEYWORD_INSTRUCTIONS)
+            keywords_text = response.strip()
+            
+            # Parse comma-separated keywords
+            keywords = [k.strip() for k in keywords_text.split(',') if k.strip()]
+            
+            # Fallback if AI fails
+            if not keywords:
+                return self._fallback_keywords(question)
+            
+            try:
+                self.semantic_cache.put(question, {'keywords': keywords, 'terms': terms})
+            except Exception as e:
+                print(f"Semantic cache update failed: {e}")
+                
+            return keywords
+            
+        except Exception as e:
+            print(f"AI keyword extraction failed: {e}")
+            return self._fallback_keywords(question)
+    
+    def _question_terms(self, question: str) -> List[str]:
+        """Dictionary keywords and drug names in a question, for validating semantic cache hits"""
+        drugs = sorted(set(_DRUG_NAME_RE.findall(question.lower())))
+        return match_medical_keywords(question) + drugs
+    
+    def _call_gemini_api(self, prompt: str, system_instruction: Optional[str] = None) -> str:
+        """Call Gemini API"""
+        return self._client.generate(prompt, system_instruction=system_instruction)
+    
+    def _fallback_keywords(self, question: str) -> List[str]:
+        """Fallback keyword extraction if AI fails"""
+        self._local.used_fallback = True
+        found_keywords = match_medical_keywords(question)
         
         if not found_keywords:
             found_keywords = ["EGFR inhibitor", "glomerulonephritis"]
@@ -113,38 +280,25 @@ class GeminiSourceRecommender(ISourceRecommender):
     def __init__(self, api_key: str = None):
         self.api_key = api_key or os.getenv('GEMINI_API_KEY')
         self.base_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+        self._client = _GeminiClient(self.api_key, self.base_url)
+        
+        # Per-thread record of whether the last answer was a fallback
+        self._local = threading.local()
+    
+    def used_fallback(self) -> bool:
+        """Whether this thread's last recommend_sources call returned the default sources"""
+        return getattr(self._local, 'used_fallback', False)
     
     def recommend_sources(self, keywords: List[str]) -> List[str]:
         """Recommend sources using Gemini AI"""
         
+        self._local.used_fallback = False
         keywords_text = ", ".join(keywords)
         
-        prompt = f"""
-You are a medical research librarian. Based on these keywords, recommend the best 3-4 medical databases to search for research papers.
-
-Keywords: {keywords_text}
-
-Available databases:
-- PubMed (MEDLINE) - Primary medical literature
-- Embase - European medical database
-- Cochrane Library - Systematic reviews and clinical trials
-- Google Scholar - Broad academic search
-- Web of Science - Citation database
-- CINAHL - Nursing and allied health
-- Scopus - Scientific literature database
-
-Instructions:
-1. Choose 3-4 most relevant databases for these specific keywords
-2. Prioritize databases that would have the most relevant papers
-3. Consider the medical domain (oncology, nephrology, pharmacology)
-
-Return ONLY a comma-separated list of database names, nothing else.
-
-Example format: PubMed, Embase, Cochrane Library
-"""
+        prompt = f"Keywords: {keywords_text}"
         
         try:
-            response = self._call_gemini_api(prompt)
+            response = self._call_gemini_api(prompt, _SOURCE_INSTRUCTIONS)
             sources_text = response.strip()
             
             # Parse comma-separated sources
@@ -152,47 +306,16 @@ Example format: PubMed, Embase, Cochrane Library
             
             # Fallback if AI fails
             if not sources:
+                self._local.used_fallback = True
                 return ["PubMed", "Google Scholar"]
                 
             return sources
             
         except Exception as e:
             print(f"AI source recommendation failed: {e}")
+            self._local.used_fallback = True
             return ["PubMed", "Google Scholar", "Embase"]
     
-    def _call_gemini_api(self, prompt: str) -> str:
+    def _call_gemini_api(self, prompt: str, system_instruction: Optional[str] = None) -> str:
         """Call Gemini API (same as in KeywordExtractor)"""
-        
-        headers = {
-            'Content-Type': 'application/json',
-            'X-goog-api-key': self.api_key
-        }
-        
-        data = {
-            "contents": [
-                {
-                    "parts": [
-                        {
-                            "text": prompt
-                        }
-                    ]
-                }
-            ]
-        }
-        
-        response = requests.post(
-            self.base_url,
-            headers=headers,
-            json=data,
-            timeout=30
-        )
-        
-        if response.status_code != 200:
-            raise Exception(f"API call failed: {response.status_code} - {response.text}")
-        
-        result = response.json()
-        
-        if 'candidates' not in result or not result['candidates']:
-            raise Exception("No response from AI")
-        
-        return result['candidates'][0]['content']['parts'][0]['text']
+        return self._client.generate(prompt, system_instruction=system_instruction)
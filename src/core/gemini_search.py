@@ -1,11 +1,70 @@
-import requests
 import json
 import re
 import os
-from typing import List, Optional
+from itertools import chain, islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from .interfaces import ISearchEngine, SearchResult, SearchResultType
+from .ai_implementations import _GeminiClient
 from datetime import datetime
 
+# Bump when search prompts change so stale cached responses are not reused
+PROMPT_VERSION = "v3"
+
+# Output budget per requested source, capped at the model's output limit
+_TOKENS_PER_SOURCE = 4000
+_MAX_OUTPUT_TOKENS = 8192
+
+# Sources the Gemini search prompt knows how to describe
+SUPPORTED_SOURCES = ("google scholar", "pubmed", "academic search")
+
+# Gemini structured-output schema for search results
+_PAPER_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "source": {"type": "STRING"},
+            "title": {"type": "STRING"},
+            "authors": {"type": "ARRAY", "items": {"type": "STRING"}},
+            "journal": {"type": "STRING"},
+            "year": {"type": "STRING"},
+            "pmid": {"type": "STRING"},
+            "doi": {"type": "STRING"},
+            "url": {"type": "STRING"},
+            "abstract": {"type": "STRING"},
+            "type": {"type": "STRING"}
+        },
+        "required": ["source", "title"]
+    }
+}
+
+# Source groups, paper blocks and per-field patterns, compiled once at import
+_SOURCE_RE = re.compile(r'SOURCE_START:\s*([^\n]+)(.*?)SOURCE_END', re.DOTALL)
+_PAPER_RE = re.compile(r'PAPER_START(.*?)PAPER_END', re.DOTALL)
+
+# Paper-like shapes tried in order when the markers are missing
+_FALLBACK_PATTERNS = (
+    re.compile(r'Title:.*?(?=Title:|$)', re.DOTALL),
+    re.compile(r'\d+\.\s*[A-Z].*?(?=\d+\.\s*[A-Z]|$)', re.DOTALL),
+)
+_NUMBERED_SPLIT_RE = re.compile(r'\n\d+\.')
+
+_FIELD_PATTERNS = {
+    'title': re.compile(r'Title:\s*(.+?)(?=\n|$)', re.IGNORECASE | re.DOTALL),
+    'authors': re.compile(r'Authors:\s*(.+?)(?=\n|$)', re.IGNORECASE | re.DOTALL),
+    'journal': re.compile(r'Journal:\s*(.+?)(?=\n|$)', re.IGNORECASE | re.DOTALL),
+    'year': re.compile(r'Year:\s*(.+?)(?=\n|$)', re.IGNORECASE | re.DOTALL),
+    'pmid': re.compile(r'PMID:\s*(.+?)(?=\n|$)', re.IGNORECASE | re.DOTALL),
+    'doi': re.compile(r'DOI:\s*(.+?)(?=\n|$)', re.IGNORECASE | re.DOTALL),
+    'url': re.compile(r'URL:\s*(.+?)(?=\n|$)', re.IGNORECASE | re.DOTALL),
+    'abstract': re.compile(r'Abstract:\s*(.+?)(?=\nType:|$)', re.IGNORECASE | re.DOTALL),
+    'type': re.compile(r'Type:\s*(.+?)(?=\n|$)', re.IGNORECASE | re.DOTALL)
+}
+
+# Fields whose values are cleaned of template brackets in one translate pass
+_BRACKETS = str.maketrans('', '', '[]')
+_BRACKETED_FIELDS = ('title', 'authors', 'journal', 'year', 'pmid', 'doi', 'url')
+
 class GeminiNativeSearchEngine(ISearchEngine):
     """Native search using Gemini's built-in web search capabilities"""
     
@@ -15,218 +74,250 @@ class GeminiNativeSearchEngine(ISearchEngine):
         
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY is required for native search")
+        
+        self._client = _GeminiClient(self.api_key, self.base_url)
     
     def search(self, keywords: List[str], source: str, limit: int = 50) -> List[SearchResult]:
         """Search using Gemini's native web search"""
+        return self.search_multi(keywords, [source], limit).get(source, [])
+    
+    def search_multi(self, keywords: List[str], sources: List[str], limit: int = 50) -> Dict[str, List[SearchResult]]:
+        """Search several sources with a single Gemini call"""
+        
+        results = {source: [] for source in sources}
+        supported = [s for s in sources if s.lower() in SUPPORTED_SOURCES]
         
-        if source.lower() not in ["google scholar", "pubmed", "academic search"]:
-            return []
+        if not supported:
+            return results
         
         try:
             # Build AI search prompt
-            search_prompt = self._build_search_prompt(keywords, source, limit)
-            print(f"🤖 Gemini Search Query for {source}")
+            search_prompt = self._build_search_prompt(keywords, supported, limit)
+            print(f"🤖 Gemini Search Query for {', '.join(supported)}")
+            
+            # Stream the search via Gemini and parse papers as they arrive
+            chunks = self._stream_gemini_search(search_prompt, len(supported))
+            for source, result in self._iter_streamed_papers(chunks, supported, limit):
+                if len(results[source]) < limit:
+                    results[source].append(result)
+                
+                # Stop reading once every source has enough papers
+                if all(len(results[s]) >= limit for s in supported):
+                    break
             
-            # Execute search via Gemini
-            ai_response = self._call_gemini_search(search_prompt)
-            print(f"📄 Raw AI response length: {len(ai_response)} chars")
+            # Close the stream now so the text read so far is cached
+            chunks.close()
             
-            # Parse AI response into SearchResult objects
-            results = self._parse_ai_response(ai_response, source)
-            print(f"🔄 Parsed {len(results)} papers")
+            for source in supported:
+                print(f"🔄 Parsed {len(results[source])} papers for {source}")
             
-            return results[:limit]
+            return results
             
         except Exception as e:
             print(f"❌ Gemini native search error: {e}")
-            return []
+            return results
     
-    def _build_search_prompt(self, keywords: List[str], source: str, limit: int) -> str:
+    def _build_search_prompt(self, keywords: List[str], sources: List[str], limit: int) -> str:
         """Build optimized search prompt for Gemini"""
         
         keywords_str = ", ".join(keywords)
         current_year = datetime.now().year
         
-        if source.lower() == "pubmed":
-            prompt = f"""
-Search PubMed and medical databases for research papers about: {keywords_str}
+        source_lines = "\n".join(
+            f"- {source}: {self._source_requirements(source, limit, current_year)}"
+            for source in sources
+        )
+        
+        prompt = f"""
+Search the sources below for research papers about: {keywords_str}
 
-Requirements:
-- Focus on papers from {current_year-3}-{current_year} (recent 3 years)
-- Find exactly {min(limit, 20)} most relevant papers
-- Include case reports, clinical studies, systematic reviews
-- Prioritize papers with EGFR inhibitor nephrotoxicity focus
+Sources and requirements:
+{source_lines}
 
-For each paper, provide this EXACT format:
-PAPER_START
-Title: [exact paper title]
-Authors: [author1, author2, author3]
-Journal: [journal name]
-Year: [publication year]
-PMID: [PubMed ID if available]
-DOI: [DOI if available]
-URL: [direct link]
-Abstract: [brief abstract or summary]
-Type: [case_report/clinical_study/systematic_review/meta_analysis/other]
-PAPER_END
+Return a JSON array with one object per paper. Set "source" to the source name exactly as listed above, "authors" to a list of names, and "type" to one of case_report, clinical_study, systematic_review, meta_analysis, other. Leave pmid or doi empty when unavailable.
 
-Search now and provide real, current papers in the exact format above.
+Search now and provide real, current papers.
 """
         
+        return prompt
+    
+    def _source_requirements(self, source: str, limit: int, current_year: int) -> str:
+        """Describe what to search for in a given source"""
+        
+        if source.lower() == "pubmed":
+            return (
+                f"PubMed and medical databases. Find exactly {min(limit, 20)} most relevant papers "
+                f"from {current_year-3}-{current_year} (recent 3 years). Include case reports, "
+                "clinical studies, systematic reviews. Prioritize papers with EGFR inhibitor "
+                "nephrotoxicity focus."
+            )
+        
         elif source.lower() == "google scholar":
-            prompt = f"""
-Search Google Scholar for academic papers about: {keywords_str}
-
-Requirements:
-- Recent papers ({current_year-3}-{current_year})
-- Find exactly {min(limit, 15)} most relevant papers
-- Focus on peer-reviewed medical literature
-- Include nephrology and oncology journals
-
-For each paper, provide this EXACT format:
-PAPER_START
-Title: [exact paper title]
-Authors: [author1, author2, author3]
-Journal: [journal name]
-Year: [publication year]
-PMID: [PubMed ID if available]  
-DOI: [DOI if available]
-URL: [Google Scholar or journal URL]
-Abstract: [brief abstract or summary]
-Type: [case_report/clinical_study/systematic_review/meta_analysis/other]
-PAPER_END
-
-Search now and provide real papers in the exact format above.
-"""
+            return (
+                f"Google Scholar. Find exactly {min(limit, 15)} most relevant recent papers "
+                f"({current_year-3}-{current_year}). Focus on peer-reviewed medical literature, "
+                "including nephrology and oncology journals. URL may be a Google Scholar or journal URL."
+            )
         
         else:
             # Generic academic search
-            prompt = f"""
-Search academic databases for papers about: {keywords_str}
-
-Find {min(limit, 15)} most relevant recent papers (2020-{current_year}) and provide in this EXACT format:
-
-PAPER_START
-Title: [exact paper title]
-Authors: [author names]
-Journal: [journal name]
-Year: [year]
-PMID: [if available]
-DOI: [if available]
-URL: [link]
-Abstract: [summary]
-Type: [paper type]
-PAPER_END
-
-Search now and provide real papers.
-"""
-        
-        return prompt
+            return (
+                f"Academic databases. Find {min(limit, 15)} most relevant recent papers "
+                f"(2020-{current_year})."
+            )
     
-    def _call_gemini_search(self, prompt: str) -> str:
-        """Execute search via Gemini API"""
-        
-        headers = {
-            'Content-Type': 'application/json',
-            'X-goog-api-key': self.api_key
-        }
+    def _stream_gemini_search(self, prompt: str, source_count: int = 1) -> Iterator[str]:
+        """Execute search via Gemini API, yielding response text as it streams in"""
         
-        data = {
-            "contents": [
-                {
-                    "parts": [
-                        {
-                            "text": prompt
-                        }
-                    ]
-                }
-            ],
-            "generationConfig": {
-                "temperature": 0.1,  # Low temperature for factual accuracy
-                "maxOutputTokens": 4000  # Allow longer responses
-            }
+        generation_config = {
+            "temperature": 0.1,  # Low temperature for factual accuracy
+            # Every source's papers share one response, so give each source its own budget
+            "maxOutputTokens": min(_TOKENS_PER_SOURCE * source_count, _MAX_OUTPUT_TOKENS),
+            # Structured output: fewer tokens than the text template and no scraping
+            "responseMimeType": "application/json",
+            "responseSchema": _PAPER_SCHEMA
         }
         
-        response = requests.post(
-            self.base_url,
-            headers=headers,
-            json=data,
-            timeout=60  # Longer timeout for search
+        return self._client.stream(
+            prompt,
+            generation_config=generation_config,
+            timeout=60,  # Longer timeout for search
+            prompt_version=PROMPT_VERSION
         )
+    
+    def _iter_streamed_papers(self, chunks: Iterable[str], sources: List[str], limit: int) -> Iterator[Tuple[str, SearchResult]]:
+        """Yield (source, result) pairs as soon as each JSON paper object is complete"""
         
-        if response.status_code != 200:
-            raise Exception(f"Gemini API error: {response.status_code} - {response.text}")
+        chunks = iter(chunks)
+        by_name = {source.lower(): source for source in sources}
+        decoder = json.JSONDecoder()
+        buffer = ""
+        in_array = False
         
-        result = response.json()
+        for chunk in chunks:
+            buffer += chunk
+            
+            if not in_array:
+                stripped = buffer.lstrip()
+                if not stripped:
+                    continue
+                if not stripped.startswith('['):
+                    # Not structured output: collect everything and use the text parser
+                    yield from self._iter_marked_papers(buffer + "".join(chunks), sources, limit)
+                    return
+                buffer = stripped[1:]
+                in_array = True
+            elif '}' not in chunk:
+                # No object can have completed since the last attempt
+                continue
+            
+            index = 0
+            while True:
+                while index < len(buffer) and buffer[index] in ' \t\r\n,':
+                    index += 1
+                if index >= len(buffer) or buffer[index] != '{':
+                    break
+                try:
+                    paper, index = decoder.raw_decode(buffer, index)
+                except ValueError:
+                    break  # Object still incomplete; wait for more text
+                
+                pair = self._json_paper_to_result(paper, by_name, sources)
+                if pair:
+                    yield pair
+            
+            # Keep only the unparsed tail so the buffer never grows with the response
+            buffer = buffer[index:]
+    
+    def _json_paper_to_result(self, paper, by_name: Dict[str, str], sources: List[str]) -> Optional[Tuple[str, SearchResult]]:
+        """Resolve a JSON paper object's source and build its SearchResult"""
+        
+        if not isinstance(paper, dict):
+            return None
+        
+        name = str(paper.get('source') or '').strip().lower()
+        source = by_name.get(name, sources[0] if len(sources) == 1 else None)
+        if not source:
+            return None
         
-        if 'candidates' not in result or not result['candidates']:
-            raise Exception("No response from Gemini search")
+        result = self._build_result(self._fields_from_json(paper), source)
         
-        return result['candidates'][0]['content']['parts'][0]['text']
+        return (source, result) if result else None
     
-    def _parse_ai_response(self, ai_response: str, source: str) -> List[SearchResult]:
-        """Parse Gemini's search response into SearchResult objects"""
+    def _iter_marked_papers(self, ai_response: str, sources: List[str], limit: int) -> Iterator[Tuple[str, SearchResult]]:
+        """Yield (source, result) pairs from the SOURCE/PAPER marker text format"""
         
-        results = []
+        by_name = {source.lower(): source for source in sources}
+        counts = dict.fromkeys(sources, 0)
         
-        # Split by PAPER_START/PAPER_END markers
-        paper_blocks = re.split(r'PAPER_START.*?PAPER_END', ai_response, flags=re.DOTALL)
+        for match in _SOURCE_RE.finditer(ai_response):
+            name = match.group(1).translate(_BRACKETS).strip().lower()
+            source = by_name.get(name)
+            if not source:
+                continue
+            
+            # Parse only as many papers as the source still needs
+            for result in islice(self._iter_ai_response(match.group(2), source), limit - counts[source]):
+                counts[source] += 1
+                yield source, result
         
-        # Alternative: find papers between markers
-        paper_pattern = r'PAPER_START(.*?)PAPER_END'
-        paper_matches = re.findall(paper_pattern, ai_response, re.DOTALL)
+        if not any(counts.values()):
+            # Source markers missing: attribute everything to the first source
+            for result in islice(self._iter_ai_response(ai_response, sources[0]), limit):
+                yield sources[0], result
+    
+    def _iter_ai_response(self, ai_response: str, source: str) -> Iterator[SearchResult]:
+        """Parse Gemini's search response into SearchResult objects lazily"""
         
-        if not paper_matches:
+        # Find papers between PAPER_START/PAPER_END markers
+        paper_matches = (m.group(1) for m in _PAPER_RE.finditer(ai_response))
+        
+        first = next(paper_matches, None)
+        if first is None:
             # Fallback: try to parse without markers
-            paper_matches = self._fallback_parse(ai_response)
+            paper_matches = iter(self._fallback_parse(ai_response))
+        else:
+            paper_matches = chain((first,), paper_matches)
         
         for paper_text in paper_matches:
             try:
                 paper = self._parse_single_paper(paper_text.strip(), source)
                 if paper:
-                    results.append(paper)
+                    yield paper
             except Exception as e:
                 print(f"⚠️ Error parsing paper: {e}")
                 continue
-        
-        return results
     
     def _parse_single_paper(self, paper_text: str, source: str) -> Optional[SearchResult]:
         """Parse a single paper from AI response"""
         
+        # Fields sit on their own "Key: value" lines, so one pass usually suffices
+        fields = self._extract_fields(paper_text)
+        if not fields['title']:
+            fields = self._extract_fields_regex(paper_text)
+        
+        return self._build_result(fields, source)
+    
+    def _build_result(self, fields: Dict[str, str], source: str) -> Optional[SearchResult]:
+        """Clean extracted fields and build a SearchResult"""
+        
         try:
-            # Extract fields using regex
-            fields = {}
-            
-            patterns = {
-                'title': r'Title:\s*(.+?)(?=\n|$)',
-                'authors': r'Authors:\s*(.+?)(?=\n|$)', 
-                'journal': r'Journal:\s*(.+?)(?=\n|$)',
-                'year': r'Year:\s*(.+?)(?=\n|$)',
-                'pmid': r'PMID:\s*(.+?)(?=\n|$)',
-                'doi': r'DOI:\s*(.+?)(?=\n|$)',
-                'url': r'URL:\s*(.+?)(?=\n|$)',
-                'abstract': r'Abstract:\s*(.+?)(?=\nType:|$)',
-                'type': r'Type:\s*(.+?)(?=\n|$)'
-            }
-            
-            for field, pattern in patterns.items():
-                match = re.search(pattern, paper_text, re.IGNORECASE | re.DOTALL)
-                fields[field] = match.group(1).strip() if match else ""
+            # Drop the [placeholder] brackets Gemini copies from the prompt template
+            for field in _BRACKETED_FIELDS:
+                fields[field] = fields[field].translate(_BRACKETS).strip()
             
             # Clean and validate
-            title = fields['title'].replace('[', '').replace(']', '').strip()
+            title = fields['title']
             if not title or len(title) < 10:
                 return None
             
             # Parse authors
-            authors_str = fields['authors'].replace('[', '').replace(']', '')
-            authors = [a.strip() for a in authors_str.split(',') if a.strip()]
+            authors = [a.strip() for a in fields['authors'].split(',') if a.strip()]
             if not authors:
                 authors = ["Unknown Author"]
             
             # Clean URLs
-            url = fields['url'].replace('[', '').replace(']', '').strip()
+            url = fields['url']
             if not url.startswith('http'):
                 url = f"https://pubmed.ncbi.nlm.nih.gov/{fields['pmid']}/" if fields['pmid'] else ""
             
@@ -236,10 +327,10 @@ Search now and provide real papers.
             return SearchResult(
                 title=title,
                 authors=authors[:5],  # Limit to 5 authors
-                journal=fields['journal'].replace('[', '').replace(']', '').strip() or "Unknown Journal",
-                publication_date=fields['year'].replace('[', '').replace(']', '').strip() or "Unknown",
-                doi=fields['doi'].replace('[', '').replace(']', '').strip() or None,
-                pmid=fields['pmid'].replace('[', '').replace(']', '').strip() or None,
+                journal=fields['journal'] or "Unknown Journal",
+                publication_date=fields['year'] or "Unknown",
+                doi=fields['doi'] or None,
+                pmid=fields['pmid'] or None,
                 url=url,
                 abstract=fields['abstract'][:500],  # Limit abstract length
                 result_type=paper_type,
@@ -250,6 +341,55 @@ Search now and provide real papers.
             print(f"⚠️ Error parsing single paper: {e}")
             return None
     
+    def _fields_from_json(self, paper: dict) -> Dict[str, str]:
+        """Map a JSON paper object onto the text-parser field names"""
+        
+        fields = {}
+        
+        for field in _FIELD_PATTERNS:
+            value = paper.get(field)
+            if isinstance(value, list):
+                value = ", ".join(str(v) for v in value)
+            fields[field] = str(value).strip() if value is not None else ""
+        
+        return fields
+    
+    def _extract_fields(self, paper_text: str) -> Dict[str, str]:
+        """Extract fields in a single pass over the paper's lines"""
+        
+        fields = dict.fromkeys(_FIELD_PATTERNS, "")
+        abstract_lines = []
+        in_abstract = False
+        
+        for line in paper_text.splitlines():
+            key, sep, value = line.partition(':')
+            key = key.strip().lower()
+            
+            if sep and key in fields:
+                # Abstracts may span several lines and run until the next field
+                in_abstract = key == 'abstract'
+                if in_abstract:
+                    abstract_lines = [value.strip()]
+                else:
+                    fields[key] = value.strip()
+            elif in_abstract:
+                abstract_lines.append(line.strip())
+        
+        fields['abstract'] = "\n".join(abstract_lines).strip()
+        
+        return fields
+    
+    def _extract_fields_regex(self, paper_text: str) -> Dict[str, str]:
+        """Extract fields with regex for text that is not line-oriented"""
+        
+        fields = {}
+        
+        for field, pattern in _FIELD_PATTERNS.items():
+            match = pattern.search(paper_text)
+            fields[field] = match.group(1).strip() if match else ""
+        
+        return fields
+    
     def _map_paper_type(self, type_str: str) -> SearchResultType:
         """Map AI response type to SearchResultType enum"""
         
@@ -270,16 +410,11 @@ Search now and provide real papers.
         """Fallback parsing when markers aren't found"""
         
         # Look for paper-like patterns
-        paper_patterns = [
-            r'Title:.*?(?=Title:|$)',
-            r'\d+\.\s*[A-Z].*?(?=\d+\.\s*[A-Z]|$)',
-        ]
-        
-        for pattern in paper_patterns:
-            matches = re.findall(pattern, text, re.DOTALL)
+        for pattern in _FALLBACK_PATTERNS:
+            matches = pattern.findall(text)
             if matches and len(matches) > 1:
                 return matches
         
         # Final fallback: split by numbers
-        sections = re.split(r'\n\d+\.', text)
+        sections = _NUMBERED_SPLIT_RE.split(text)
         return [s.strip() for s in sections if len(s.strip()) > 100]
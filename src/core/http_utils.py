@@ -0,0 +1,57 @@
+import threading
+import time
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
+
+def create_session(pool_connections: int = 10, pool_maxsize: int = 20,
+                   retries: int = 2, backoff_factor: float = 0.3) -> requests.Session:
+    """Create a keep-alive session with connection pooling and retries"""
+
+    session = requests.Session()
+
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=None  # Gemini calls are POSTs; retry them too
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry
+    )
+    session.mount('https://', adapter)
+
+    # Advertise every encoding urllib3 can decode here (adds br when brotli is installed)
+    session.headers['Accept-Encoding'] = make_headers(accept_encoding=True)['accept-encoding']
+
+    return session
+
+class RateLimiter:
+    """Thread-safe sliding-window limiter: at most max_calls per period"""
+
+    def __init__(self, max_calls: int, period: float = 1.0):
+        self.max_calls = max_calls
+        self.period = period
+        self._lock = threading.Lock()
+        self._calls = deque()
+
+    def wait(self) -> None:
+        """Block until the caller may make its next call"""
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.period:
+                    self._calls.popleft()
+
+                if len(self._calls) < self.max_calls:
+                    self._calls.append(now)
+                    return
+
+                delay = self.period - (now - self._calls[0])
+
+            time.sleep(delay)
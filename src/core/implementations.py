@@ -1,27 +1,60 @@
-from typing import List
+import heapq
+import re
+from functools import lru_cache
+from typing import List, Tuple
 from .interfaces import (
     IKeywordExtractor, ISourceRecommender, ISearchEngine, 
     IContentAnalyzer, IReportGenerator,
     SearchResult, SearchResultType, ResearchQuery, ResearchReport
 )
 
+# Dictionary used for rule-based keyword extraction
+MEDICAL_KEYWORDS = (
+    "osimertinib", "EGFR inhibitor", "glomerulonephritis",
+    "acute", "kidney", "nephrotoxicity", "renal"
+)
+
+# Most relevant papers listed in a report, and the score that counts as relevant
+MAX_REPORT_PAPERS = 50
+RELEVANCE_THRESHOLD = 0.5
+
+# Lowercase title phrases that identify a paper type, in priority order
+PAPER_TYPE_TERMS = (
+    ("case report", SearchResultType.CASE_REPORT),
+    ("systematic review", SearchResultType.SYSTEMATIC_REVIEW),
+    ("meta-analysis", SearchResultType.META_ANALYSIS),
+    ("clinical trial", SearchResultType.CLINICAL_STUDY),
+)
+
+_PAPER_TYPE_RE = re.compile(
+    "|".join(f"(?P<t{i}>{re.escape(term)})" for i, (term, _) in enumerate(PAPER_TYPE_TERMS))
+)
+
+@lru_cache(maxsize=64)
+def _keyword_pattern(terms: Tuple[str, ...]) -> "re.Pattern":
+    """Compile (once per keyword set) a lookahead alternation over lowercase terms"""
+    return re.compile("(?=(" + "|".join(re.escape(t) for t in terms) + "))")
+
+@lru_cache(maxsize=64)
+def _longest_first(terms: Tuple[str, ...]) -> Tuple[str, ...]:
+    """Lowercase, deduplicated terms ordered longest first (ties alphabetically) for _keyword_pattern"""
+    return tuple(sorted({t.lower() for t in terms}, key=lambda t: (-len(t), t)))
+
+def match_medical_keywords(question: str) -> List[str]:
+    """Return dictionary keywords found in the question, in dictionary order"""
+    
+    pattern = _keyword_pattern(_longest_first(MEDICAL_KEYWORDS))
+    hits = {m.group(1) for m in pattern.finditer(question.lower())}
+    
+    # Each position reports only its longest term; shorter ones starting there
+    # ("egfr" within "egfr inhibitor") are recovered by the substring check
+    return [keyword for keyword in MEDICAL_KEYWORDS if any(keyword.lower() in hit for hit in hits)]
+
 class SimpleKeywordExtractor(IKeywordExtractor):
     """Simple keyword extractor for testing"""
     
     def extract_keywords(self, question: str) -> List[str]:
-        
-        medical_keywords = [
-            "osimertinib", "EGFR inhibitor", "glomerulonephritis", 
-            "acute", "kidney", "nephrotoxicity", "renal"
-        ]
-        
-        found_keywords = []
-        question_lower = question.lower()
-        
-        for keyword in medical_keywords:
-            if keyword.lower() in question_lower:
-                found_keywords.append(keyword)
-        
+        found_keywords = match_medical_keywords(question)
         
         if not found_keywords:
             found_keywords = ["EGFR inhibitor", "glomerulonephritis"]
@@ -74,43 +107,89 @@ class SimpleContentAnalyzer(IContentAnalyzer):
     
     def analyze_relevance(self, result: SearchResult, query: ResearchQuery) -> float:
         score = 0.0
-        title_lower = result.title.lower()
-        abstract_lower = result.abstract.lower()
+        title_lower = result.title_lc
+        abstract_lower = result.abstract_lc
         
         for keyword in query.keywords:
             keyword_lower = keyword.lower()
             if keyword_lower in title_lower:
                 score += 0.3
-            if keyword_lower in abstract_lower:
+            # Titles are short, so check them first and skip the abstract once saturated
+            if score < 1.0 and keyword_lower in abstract_lower:
                 score += 0.2
+            if score >= 1.0:
+                return 1.0
                 
         return min(score, 1.0)
     
+    def analyze_relevance_batch(self, results: List[SearchResult], query: ResearchQuery) -> List[float]:
+        keywords = [keyword.lower() for keyword in query.keywords]
+        if not keywords:
+            return [0.0] * len(results)
+        
+        # Longest terms first so each position reports the longest keyword there;
+        # shorter keywords inside it are recovered by the substring check below.
+        # Ties sort alphabetically so the same keyword set reuses its compiled pattern.
+        pattern = _keyword_pattern(_longest_first(tuple(keywords)))
+        
+        scores = []
+        for result in results:
+            title_hits = {m.group(1) for m in pattern.finditer(result.title_lc)}
+            abstract_hits = {m.group(1) for m in pattern.finditer(result.abstract_lc)}
+            
+            score = 0.0
+            for keyword in keywords:
+                if keyword in title_hits or any(keyword in hit for hit in title_hits):
+                    score += 0.3
+                if score < 1.0 and (keyword in abstract_hits or any(keyword in hit for hit in abstract_hits)):
+                    score += 0.2
+                if score >= 1.0:
+                    break
+            
+            scores.append(min(score, 1.0))
+        
+        return scores
+    
     def classify_paper_type(self, result: SearchResult) -> SearchResultType:
-        title_lower = result.title.lower()
+        # One scan over the title; the earliest entry in PAPER_TYPE_TERMS wins
+        best = len(PAPER_TYPE_TERMS)
+        for match in _PAPER_TYPE_RE.finditer(result.title_lc):
+            best = min(best, int(match.lastgroup[1:]))
+            if best == 0:
+                break
+        
+        if best < len(PAPER_TYPE_TERMS):
+            return PAPER_TYPE_TERMS[best][1]
+        return SearchResultType.OTHER
+    
+    def classify_paper_type_batch(self, results: List[SearchResult]) -> List[SearchResultType]:
+        # Pull the titles out as one column and scan them with a single bound method
+        titles = [result.title_lc for result in results]
+        finditer = _PAPER_TYPE_RE.finditer
+        no_match = len(PAPER_TYPE_TERMS)
+        
+        types = []
+        for title in titles:
+            best = min((int(match.lastgroup[1:]) for match in finditer(title)), default=no_match)
+            types.append(PAPER_TYPE_TERMS[best][1] if best < no_match else SearchResultType.OTHER)
         
-        if "case report" in title_lower:
-            return SearchResultType.CASE_REPORT
-        elif "systematic review" in title_lower:
-            return SearchResultType.SYSTEMATIC_REVIEW
-        elif "meta-analysis" in title_lower:
-            return SearchResultType.META_ANALYSIS
-        elif "clinical trial" in title_lower:
-            return SearchResultType.CLINICAL_STUDY
-        else:
-            return SearchResultType.OTHER
+        return types
 
 class SimpleReportGenerator(IReportGenerator):
     """Simple report generator for testing"""
     
     def generate_report(self, query: ResearchQuery, results: List[SearchResult]) -> ResearchReport:
-        relevant_papers = [r for r in results if r.relevance_score >= 0.5]
+        relevant = [r for r in results if r.relevance_score >= RELEVANCE_THRESHOLD]
+        
+        # List only the best-scoring papers, best first; ties keep search order
+        relevant_papers = heapq.nlargest(MAX_REPORT_PAPERS, relevant, key=lambda r: r.relevance_score)
         
         return ResearchReport(
             query=query,
             total_papers_found=len(results),
             relevant_papers=relevant_papers,
-            summary=f"Found {len(results)} papers, {len(relevant_papers)} relevant to your query about EGFR inhibitor nephrotoxicity.",
+            relevant_count=len(relevant),
+            summary=f"Found {len(results)} papers, {len(relevant)} relevant to your query about EGFR inhibitor nephrotoxicity.",
             key_findings=[
                 "Case reports suggest acute glomerulonephritis can occur with osimertinib",
                 "Systematic reviews indicate renal monitoring is recommended"
@@ -1,10 +1,10 @@
 from abc import ABC, abstractmethod
 from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 
 # DOMAIN MODELS
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ResearchQuery:
     """Represents a research query with its components"""
     original_question: str
@@ -19,7 +19,7 @@ class SearchResultType(Enum):
     META_ANALYSIS = "meta_analysis"
     OTHER = "other"
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class SearchResult:
     """Represents a single search result"""
     title: str
@@ -32,8 +32,15 @@ class SearchResult:
     abstract: str
     result_type: SearchResultType
     relevance_score: float
+    # Lowercased copies for keyword matching, computed once per result
+    title_lc: str = field(init=False, repr=False, compare=False)
+    abstract_lc: str = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        object.__setattr__(self, 'title_lc', self.title.lower())
+        object.__setattr__(self, 'abstract_lc', self.abstract.lower())
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ResearchReport:
     """Final research report"""
     query: ResearchQuery
@@ -43,6 +50,7 @@ class ResearchReport:
     key_findings: List[str]
     recommendations: List[str]
     evidence_level: str
+    relevant_count: Optional[int] = None  # All relevant papers, when relevant_papers is capped
 
 # CORE INTERFACES
 class IKeywordExtractor(ABC):
@@ -51,6 +59,10 @@ class IKeywordExtractor(ABC):
     @abstractmethod
     def extract_keywords(self, question: str) -> List[str]:
         pass
+    
+    def used_fallback(self) -> bool:
+        """Whether this thread's last call returned default keywords instead of a real answer"""
+        return False
 
 class ISourceRecommender(ABC):
     """Interface for source recommendation strategies"""
@@ -58,6 +70,10 @@ class ISourceRecommender(ABC):
     @abstractmethod
     def recommend_sources(self, keywords: List[str]) -> List[str]:
         pass
+    
+    def used_fallback(self) -> bool:
+        """Whether this thread's last call returned default sources instead of a real answer"""
+        return False
 
 class ISearchEngine(ABC):
     """Interface for different search engines"""
@@ -65,6 +81,9 @@ class ISearchEngine(ABC):
     @abstractmethod
     def search(self, keywords: List[str], source: str, limit: int = 50) -> List[SearchResult]:
         pass
+    
+    def search_multi(self, keywords: List[str], sources: List[str], limit: int = 50) -> Dict[str, List[SearchResult]]:
+        return {source: self.search(keywords, source, limit) for source in sources}
 
 class IContentAnalyzer(ABC):
     """Interface for content analysis strategies"""
@@ -73,9 +92,15 @@ class IContentAnalyzer(ABC):
     def analyze_relevance(self, result: SearchResult, query: ResearchQuery) -> float:
         pass
     
+    def analyze_relevance_batch(self, results: List[SearchResult], query: ResearchQuery) -> List[float]:
+        return [self.analyze_relevance(result, query) for result in results]
+    
     @abstractmethod
     def classify_paper_type(self, result: SearchResult) -> SearchResultType:
         pass
+    
+    def classify_paper_type_batch(self, results: List[SearchResult]) -> List[SearchResultType]:
+        return [self.classify_paper_type(result) for result in results]
 
 class IReportGenerator(ABC):
     """Interface for report generation strategies"""
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import orjson
+import threading
+import time
+from typing import Optional
+
+# On-disk prompt -> response cache for Gemini calls
+CACHE_DIR = os.getenv('LLM_CACHE_DIR', os.path.join('data', 'llm_cache'))
+CACHE_TTL = 7 * 24 * 3600  # 7 days
+
+# Expired files are swept at most this often, and the oldest go first past the cap
+SWEEP_INTERVAL = 3600
+MAX_ENTRIES = 20000
+
+_sweep_lock = threading.Lock()
+_last_sweep = 0.0
+
+def _cache_path(prompt: str, version: str) -> str:
+    """Build the cache file path for a prompt"""
+    key = hashlib.sha256((version + prompt).encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+def get(prompt: str, version: str = "") -> Optional[str]:
+    """Return the cached response for a prompt, or None on miss/expiry"""
+
+    path = _cache_path(prompt, version)
+
+    try:
+        with open(path, 'rb') as f:
+            entry = orjson.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+    if entry.get('expires_at', 0) < time.time():
+        _remove(path)
+        return None
+
+    return entry.get('response')
+
+def set(prompt: str, response: str, version: str = "") -> None:
+    """Store a response for a prompt"""
+
+    path = _cache_path(prompt, version)
+    now = time.time()
+    entry = {
+        'response': response,
+        'created_at': now,
+        'expires_at': now + CACHE_TTL
+    }
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Write to a temp file first so concurrent readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(entry))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ Could not write LLM cache entry: {e}")
+        return
+
+    _maybe_sweep(now)
+
+def _maybe_sweep(now: float) -> None:
+    """Delete expired entries, then the oldest beyond MAX_ENTRIES, once per SWEEP_INTERVAL"""
+
+    global _last_sweep
+
+    with _sweep_lock:
+        if now - _last_sweep < SWEEP_INTERVAL:
+            return
+        _last_sweep = now
+
+    # Entries are written once, so the file's mtime is its creation time
+    entries = []
+    try:
+        with os.scandir(CACHE_DIR) as it:
+            for dir_entry in it:
+                # Only sha256-named entries; other caches may share the directory
+                if len(dir_entry.name) == 69 and dir_entry.name.endswith('.json'):
+                    try:
+                        entries.append((dir_entry.stat().st_mtime, dir_entry.path))
+                    except OSError:
+                        continue
+    except OSError:
+        return
+
+    entries.sort()
+    expired = sum(1 for mtime, _ in entries if mtime + CACHE_TTL < now)
+    excess = len(entries) - MAX_ENTRIES
+    for _, path in entries[:max(expired, excess)]:
+        _remove(path)
+
+def _remove(path: str) -> None:
+    """Delete a cache file, ignoring races with other writers"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -1,16 +1,46 @@
-import requests
-import xml.etree.ElementTree as ET
+import os
+import re
+try:
+    import lxml.etree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from typing import List, Dict, Optional
 from .interfaces import ISearchEngine, SearchResult, SearchResultType
-import time
+from .http_utils import RateLimiter, create_session
+from .utils import trim_oldest
 
 class PubMedSearchEngine(ISearchEngine):
     """Real PubMed search implementation using NCBI E-utilities API"""
     
+    # Keyword categories for query building; substring matches, drugs take priority
+    _DRUG_RE = re.compile(r'osimertinib|erlotinib|gefitinib|egfr inhibitor|tyrosine kinase', re.IGNORECASE)
+    _CONDITION_RE = re.compile(r'nephrotoxicity|glomerulonephritis|renal|kidney', re.IGNORECASE)
+    
     def __init__(self):
         self.base_search_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
         self.base_fetch_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
-        self.base_summary_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi"
+        
+        # Reuse keep-alive connections across esearch and every efetch batch
+        self.session = create_session(retries=3, backoff_factor=0.5)
+        self.session.headers['User-Agent'] = 'egfr-research-agent/1.0'
+        
+        # Identify ourselves to NCBI; an API key raises the limit to 10 requests/second
+        self.api_key = os.getenv('NCBI_API_KEY')
+        self.tool = os.getenv('NCBI_TOOL', 'egfr-research-agent')
+        self.email = os.getenv('NCBI_EMAIL')
+        self.rate_limiter = RateLimiter(10 if self.api_key else 3, 1.0)
+        
+        # Parsed articles by PMID; results are immutable so they can be shared
+        self._pmid_cache: Dict[str, SearchResult] = {}
+        self._pmid_cache_size = 4096
+        self._cache_lock = threading.Lock()
+        
+        # esearch validators and ids by query, for conditional re-requests
+        self._esearch_cache: Dict[str, tuple] = {}
+        self._esearch_cache_size = 4096
     
     def search(self, keywords: List[str], source: str, limit: int = 50) -> List[SearchResult]:
         """Search PubMed for papers"""
@@ -41,47 +71,30 @@ class PubMedSearchEngine(ISearchEngine):
             print(f"❌ PubMed search error: {e}")
             return []
     
+    def warm_up(self) -> None:
+        """Open a pooled connection to E-utilities ahead of the first search"""
+        self.rate_limiter.wait()
+        self.session.head(self.base_search_url, timeout=5)
+    
     def _build_search_query(self, keywords: List[str]) -> str:
         """Build PubMed search query using winning strategy from tests"""
         
-        # Categorize keywords based on test results
-        drug_terms = []
-        condition_terms = []
-        general_terms = []
-        
+        # Categorize keywords based on test results; bucket order is the strategy order:
+        # 1. drug terms (winner strategy), 2. kidney/renal conditions, 3. general terms
+        buckets = {'drug': [], 'condition': [], 'general': []}
         for keyword in keywords:
-            keyword_lower = keyword.lower()
-            
-            # EGFR inhibitor drugs
-            if any(drug in keyword_lower for drug in ['osimertinib', 'erlotinib', 'gefitinib', 'egfr inhibitor', 'tyrosine kinase']):
-                drug_terms.append(f'"{keyword}"[Title/Abstract]')
-            # Kidney/renal conditions  
-            elif any(condition in keyword_lower for condition in ['nephrotoxicity', 'glomerulonephritis', 'renal', 'kidney']):
-                condition_terms.append(f'"{keyword}"[Title/Abstract]')
-            # General terms
-            else:
-                general_terms.append(f'"{keyword}"[Title/Abstract]')
-        
-        # Build query using winning strategies
-        query_parts = []
-        
-        # Strategy 1: Drug terms with OR (winner strategy)
-        if drug_terms:
-            query_parts.append("(" + " OR ".join(drug_terms) + ")")
-        
-        # Strategy 2: Condition terms with OR
-        if condition_terms:
-            query_parts.append("(" + " OR ".join(condition_terms) + ")")
-        
-        # Strategy 3: General terms with OR
-        if general_terms:
-            query_parts.append("(" + " OR ".join(general_terms) + ")")
-        
-        # Combine with AND (each category must have at least one match)
-        if len(query_parts) > 1:
+            category = (
+                'drug' if self._DRUG_RE.search(keyword)
+                else 'condition' if self._CONDITION_RE.search(keyword)
+                else 'general'
+            )
+            buckets[category].append(f'"{keyword}"[Title/Abstract]')
+        
+        # OR within a category, AND across categories (each must have at least one match)
+        query_parts = [f"({' OR '.join(terms)})" for terms in buckets.values() if terms]
+        
+        if query_parts:
             query = " AND ".join(query_parts)
-        elif query_parts:
-            query = query_parts[0]
         else:
             # Fallback: simple OR of all terms
             all_terms = [f'"{kw}"[Title/Abstract]' for kw in keywords]
@@ -100,107 +113,170 @@ class PubMedSearchEngine(ISearchEngine):
             'term': query,
             'retmax': limit,
             'retmode': 'xml',
-            'sort': 'relevance'
+            'sort': 'relevance',
+            **self._identity_params()
         }
         
-        response = requests.get(self.base_search_url, params=params, timeout=30)
-        response.raise_for_status()
+        # Ask NCBI to answer 304 if this exact search has not changed
+        cache_key = f"{query}|{limit}"
+        with self._cache_lock:
+            cached = self._esearch_cache.get(cache_key)
+        headers = cached[0] if cached else {}
         
-        # Parse XML response
-        root = ET.fromstring(response.content)
-        id_list = root.find('IdList')
+        self.rate_limiter.wait()
+        with self.session.get(self.base_search_url, params=params, headers=headers, timeout=30, stream=True) as response:
+            if response.status_code == 304 and cached:
+                return list(cached[1])
+            
+            response.raise_for_status()
+            
+            # Parse XML response incrementally as it arrives
+            ids = [id_elem.text for id_elem in self._iter_elements(response, 'Id')]
         
-        if id_list is None:
-            return []
+        validators = {}
+        if response.headers.get('ETag'):
+            validators['If-None-Match'] = response.headers['ETag']
+        if response.headers.get('Last-Modified'):
+            validators['If-Modified-Since'] = response.headers['Last-Modified']
         
-        return [id_elem.text for id_elem in id_list.findall('Id')]
+        if validators:
+            with self._cache_lock:
+                self._esearch_cache.pop(cache_key, None)
+                self._esearch_cache[cache_key] = (validators, ids)
+                trim_oldest(self._esearch_cache, self._esearch_cache_size)
+        
+        return ids
     
     def _fetch_paper_details(self, paper_ids: List[str]) -> List[SearchResult]:
         """Fetch detailed information for papers"""
         
-        results = []
+        # Only download articles we have not parsed before
+        with self._cache_lock:
+            found = {pmid: self._pmid_cache[pmid] for pmid in paper_ids if pmid in self._pmid_cache}
+        to_fetch = [pmid for pmid in paper_ids if pmid not in found]
         
-        # Process in batches to avoid API limits
-        batch_size = 20
-        for i in range(0, len(paper_ids), batch_size):
-            batch_ids = paper_ids[i:i + batch_size]
-            batch_results = self._fetch_batch_details(batch_ids)
-            results.extend(batch_results)
-            
-            # Rate limiting
-            time.sleep(0.5)
+        if found:
+            print(f"♻️ {len(found)} PubMed articles served from cache")
         
-        return results
+        # efetch accepts a few hundred ids per POST, so most searches need one request
+        batch_size = 200
+        batches = [to_fetch[i:i + batch_size] for i in range(0, len(to_fetch), batch_size)]
+        
+        # Batches are independent, so keep several in flight; the rate limiter paces them
+        fetched = []
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            for batch_results in executor.map(self._fetch_batch_details, batches):
+                fetched.extend(batch_results)
+        
+        with self._cache_lock:
+            for result in fetched:
+                self._pmid_cache[result.pmid] = result
+            trim_oldest(self._pmid_cache, self._pmid_cache_size)
+        
+        found.update((result.pmid, result) for result in fetched)
+        
+        # Keep esearch's relevance order
+        return [found[pmid] for pmid in paper_ids if pmid in found]
     
     def _fetch_batch_details(self, paper_ids: List[str]) -> List[SearchResult]:
         """Fetch details for a batch of papers"""
         
         ids_str = ",".join(paper_ids)
         
-        # Get paper summaries
+        # Get full records (including abstracts) in one efetch call
         params = {
             'db': 'pubmed',
             'id': ids_str,
-            'retmode': 'xml'
+            'rettype': 'abstract',
+            'retmode': 'xml',
+            **self._identity_params()
         }
         
-        response = requests.get(self.base_summary_url, params=params, timeout=30)
-        response.raise_for_status()
+        # POST keeps long id lists out of the URL
+        self.rate_limiter.wait()
+        with self.session.post(self.base_fetch_url, data=params, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            
+            # Parse XML one article at a time instead of building the whole tree
+            results = []
+            
+            for article in self._iter_elements(response, 'PubmedArticle'):
+                try:
+                    result = self._parse_pubmed_article(article)
+                    if result:
+                        results.append(result)
+                except Exception as e:
+                    print(f"⚠️ Error parsing document: {e}")
+                    continue
+        
+        return results
+    
+    def _identity_params(self) -> Dict[str, str]:
+        """E-utilities parameters identifying this client"""
+        
+        params = {'tool': self.tool}
+        if self.email:
+            params['email'] = self.email
+        if self.api_key:
+            params['api_key'] = self.api_key
+        return params
+    
+    def _iter_elements(self, response, tag: str):
+        """Yield each completed element with the given tag from a streamed response, freeing it afterwards"""
         
-        # Parse XML
-        root = ET.fromstring(response.content)
-        results = []
+        # Read straight from the socket, letting urllib3 undo any gzip encoding
+        response.raw.decode_content = True
         
-        for doc_sum in root.findall('DocumentSummary'):
-            try:
-                result = self._parse_document_summary(doc_sum)
-                if result:
-                    results.append(result)
-            except Exception as e:
-                print(f"⚠️ Error parsing document: {e}")
+        for _, elem in ET.iterparse(response.raw, events=('end',)):
+            if elem.tag != tag:
                 continue
-        
-        return results
+            
+            yield elem
+            elem.clear()
+            
+            # lxml keeps cleared siblings attached to the parent; drop them too
+            if hasattr(elem, 'getprevious'):
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
     
-    def _parse_document_summary(self, doc_sum) -> Optional[SearchResult]:
-        """Parse a single document summary"""
+    def _parse_pubmed_article(self, article) -> Optional[SearchResult]:
+        """Parse a single efetch PubmedArticle record"""
         
         try:
+            citation = article.find('MedlineCitation')
+            details = citation.find('Article')
+            
             # Extract basic info
-            pmid = doc_sum.get('uid', '')
-            title = self._get_text_content(doc_sum, 'Title', 'Unknown Title')
-            
-            # Extract authors
-            authors = []
-            author_list = doc_sum.find('AuthorList')
-            if author_list is not None:
-                for author in author_list.findall('Author')[:3]:  # First 3 authors
-                    name = author.get('Name', '')
-                    if name:
-                        authors.append(name)
+            pmid = self._get_text_content(citation, 'PMID', '')
+            title = self._get_text_content(details, 'ArticleTitle', 'Unknown Title')
+            
+            # Extract authors ("Smith J" style, as esummary reports them), visiting only the first 3
+            authors = [
+                name for author in islice(details.iterfind('AuthorList/Author'), 3)
+                if (name := self._author_name(author))
+            ]
             
             if not authors:
                 authors = ['Unknown Author']
             
             # Extract journal and date
-            journal = self._get_text_content(doc_sum, 'FullJournalName', 'Unknown Journal')
-            pub_date = self._get_text_content(doc_sum, 'PubDate', 'Unknown Date')
-            
-            # Generate DOI URL (may not always exist)
-            doi = None
-            article_ids = doc_sum.find('ArticleIds')
-            if article_ids is not None:
-                for article_id in article_ids.findall('ArticleId'):
-                    if article_id.get('IdType') == 'doi':
-                        doi = article_id.text
-                        break
+            journal = self._get_text_content(details, 'Journal/Title', 'Unknown Journal')
+            pub_date = self._format_pub_date(details.find('Journal/JournalIssue/PubDate'))
+            
+            # DOI (may not always exist)
+            doi_elem = article.find("PubmedData/ArticleIdList/ArticleId[@IdType='doi']")
+            if doi_elem is None:
+                doi_elem = details.find("ELocationID[@EIdType='doi']")
+            doi = doi_elem.text if doi_elem is not None else None
             
             # Build URL
             url = f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
             
-            # Get abstract (this would require additional API call)
-            # For now, use title as abstract placeholder
-            abstract = title
+            # Structured abstracts come as several labelled sections; fall back to the title
+            abstract = " ".join(
+                "".join(section.itertext()).strip()
+                for section in details.iterfind('Abstract/AbstractText')
+            ).strip() or title
             
             return SearchResult(
                 title=title,
@@ -216,12 +292,32 @@ class PubMedSearchEngine(ISearchEngine):
             )
             
         except Exception as e:
-            print(f"⚠️ Error parsing document summary: {e}")
+            print(f"⚠️ Error parsing PubMed article: {e}")
             return None
     
+    def _author_name(self, author) -> str:
+        """Format an efetch Author element as "LastName Initials" or a collective name"""
+        
+        last_name = author.findtext('LastName')
+        if last_name:
+            initials = author.findtext('Initials')
+            return f"{last_name} {initials}" if initials else last_name
+        return author.findtext('CollectiveName') or ''
+
+    def _format_pub_date(self, pub_date) -> str:
+        """Format an efetch PubDate as "2020 Mar 15", or its free-text MedlineDate"""
+        
+        if pub_date is None:
+            return 'Unknown Date'
+        
+        parts = [pub_date.findtext(part) for part in ('Year', 'Month', 'Day')]
+        return " ".join(filter(None, parts)) or pub_date.findtext('MedlineDate') or 'Unknown Date'
+    
     def _get_text_content(self, element, tag: str, default: str) -> str:
         """Safely extract text content from XML element"""
         child = element.find(tag)
-        if child is not None and child.text:
-            return child.text.strip()
-        return default
+        if child is None:
+            return default
+        # itertext keeps text inside inline markup such as <i> in titles
+        text = "".join(child.itertext()).strip()
+        return text or default
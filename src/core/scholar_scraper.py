@@ -1,27 +1,87 @@
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import time
 import random
-from typing import List, Optional
+import orjson
+import re
+import soupsieve as sv
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import List, Optional, Tuple
 from .interfaces import ISearchEngine, SearchResult, SearchResultType
-from .ai_implementations import GeminiKeywordExtractor
-import os
+from .http_utils import RateLimiter, create_session
+from .utils import normalize_title
+from . import llm_cache
+
+# Snippet parsing patterns, compiled once
+_YEAR_RE = re.compile(r'\b(20[0-2][0-9])\b')
+_AUTHOR_PATTERNS = (
+    re.compile(r'([A-Z][a-z]+ [A-Z][a-z]+(?:, [A-Z][a-z]+ [A-Z][a-z]+)*)'),
+    re.compile(r'([A-Z]\. [A-Z][a-z]+(?:, [A-Z]\. [A-Z][a-z]+)*)')
+)
+
+# Bump when the relevance prompt changes so stored verdicts are not reused
+RELEVANCE_CACHE_VERSION = "relevance-v2"
+
+# Gemini structured-output schema for batched relevance verdicts
+_RELEVANCE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "i": {"type": "INTEGER"},
+            "relevant": {"type": "BOOLEAN"},
+            "score": {"type": "INTEGER"}
+        },
+        "required": ["i", "relevant", "score"]
+    }
+}
+
+# Prefer the C-backed lxml parser when it is installed
+try:
+    import lxml  # noqa: F401
+    _HTML_PARSER = 'lxml'
+except ImportError:
+    _HTML_PARSER = 'html.parser'
+
+# Only result containers are needed, so skip building the rest of the page.
+# The strainer sees the raw class attribute, so match tF2Cxc as one of several classes.
+_RESULT_STRAINER = SoupStrainer('div', class_=re.compile(r'(?:^|\s)tF2Cxc(?:\s|$)'))
+
+# CSS selectors for result fields, compiled once instead of per container
+_CONTAINER_SEL = sv.compile('div.tF2Cxc')
+_TITLE_SEL = sv.compile('h3.LC20lb')
+_LINK_SEL = sv.compile('a')
+_SNIPPET_SEL = sv.compile('div.VwiC3b')
+_CITE_SEL = sv.compile('cite')
 
 class GoogleScholarScraper(ISearchEngine):
     """Google Scholar web scraper with AI relevance filtering"""
     
+    # Gemini free tier allows about 60 requests/minute, shared by all checks
+    _AI_RATE_LIMITER = RateLimiter(60, 60.0)
+    
+    # Papers scored per Gemini call
+    _RELEVANCE_BATCH_SIZE = 20
+    
+    # Keywords containing any of these get quoted into the query
+    _IMPORTANT_TERM_RE = re.compile(r'egfr|osimertinib|erlotinib|nephrotoxicity|glomerulonephritis', re.IGNORECASE)
+    
     def __init__(self):
         self.base_url = "https://www.google.com/search"
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
             'Connection': 'keep-alive',
         }
         
-        # Initialize AI relevance checker
+        # Pooled session so result pages reuse the same connection; it also sets Accept-Encoding
+        self.session = create_session(retries=3, backoff_factor=0.5)
+        self.session.headers.update(self.headers)
+        
+        # Initialize AI relevance checker; imported here so the scraper loads without the Gemini stack
         try:
+            from .ai_implementations import GeminiKeywordExtractor
             self.ai_checker = GeminiKeywordExtractor()
             self.ai_enabled = True
         except:
@@ -65,7 +125,7 @@ class GoogleScholarScraper(ISearchEngine):
         # Create quoted phrases for important keywords
         important_terms = []
         for keyword in keywords:
-            if any(term in keyword.lower() for term in ['egfr', 'osimertinib', 'erlotinib', 'nephrotoxicity', 'glomerulonephritis']):
+            if self._IMPORTANT_TERM_RE.search(keyword):
                 important_terms.append(f'"{keyword}"')
         
         # Combine with site restriction
@@ -84,47 +144,57 @@ class GoogleScholarScraper(ISearchEngine):
         results = []
         num_pages = min(3, (limit // 10) + 1)  # Max 3 pages
         
-        for page in range(num_pages):
-            try:
-                # Build URL
-                params = {
-                    'q': query,
-                    'start': page * 10,
-                    'num': 10
-                }
-                
-                # Random delay to avoid blocking
-                time.sleep(random.uniform(1, 3))
-                
-                # Make request
-                response = requests.get(self.base_url, params=params, headers=self.headers, timeout=15)
-                response.raise_for_status()
-                
-                # Parse HTML
-                soup = BeautifulSoup(response.content, 'html.parser')
+        # Pages are independent; keep concurrency low so Google does not block us
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            pages = executor.map(lambda page: self._fetch_page(query, page), range(num_pages))
+            
+            for page, page_results in enumerate(pages):
+                if page_results is None:
+                    break
                 
-                # Extract results from this page
-                page_results = self._parse_search_page(soup)
                 results.extend(page_results)
-                
                 print(f"📄 Page {page + 1}: {len(page_results)} results")
                 
                 if len(results) >= limit:
                     break
-                    
-            except Exception as e:
-                print(f"Error scraping page {page + 1}: {e}")
-                break
         
         return results[:limit]
     
+    def _fetch_page(self, query: str, page: int) -> Optional[List[dict]]:
+        """Fetch and parse one results page, or None if it failed"""
+        
+        try:
+            # Build URL
+            params = {
+                'q': query,
+                'start': page * 10,
+                'num': 10
+            }
+            
+            # Random delay to avoid blocking
+            time.sleep(random.uniform(0.5, 1.5))
+            
+            # Make request
+            response = self.session.get(self.base_url, params=params, timeout=15)
+            response.raise_for_status()
+            
+            # Parse HTML
+            soup = BeautifulSoup(response.content, _HTML_PARSER, parse_only=_RESULT_STRAINER)
+            
+            # Extract results from this page
+            return self._parse_search_page(soup)
+            
+        except Exception as e:
+            print(f"Error scraping page {page + 1}: {e}")
+            return None
+    
     def _parse_search_page(self, soup: BeautifulSoup) -> List[dict]:
         """Parse individual search results from page"""
         
         results = []
         
         # Find result containers
-        result_containers = soup.find_all('div', class_='tF2Cxc')
+        result_containers = _CONTAINER_SEL.select(soup)
         
         for container in result_containers:
             try:
@@ -142,23 +212,23 @@ class GoogleScholarScraper(ISearchEngine):
         
         try:
             # Extract title
-            title_elem = container.find('h3', class_='LC20lb')
+            title_elem = _TITLE_SEL.select_one(container)
             if not title_elem:
                 return None
             title = title_elem.get_text().strip()
             
             # Extract URL
-            link_elem = container.find('a')
+            link_elem = _LINK_SEL.select_one(container)
             if not link_elem:
                 return None
             url = link_elem.get('href', '')
             
             # Extract snippet/description
-            snippet_elem = container.find('div', class_='VwiC3b')
+            snippet_elem = _SNIPPET_SEL.select_one(container)
             snippet = snippet_elem.get_text().strip() if snippet_elem else ""
             
             # Extract citation info if available
-            cite_elem = container.find('cite')
+            cite_elem = _CITE_SEL.select_one(container)
             domain = cite_elem.get_text().strip() if cite_elem else ""
             
             return {
@@ -176,10 +246,9 @@ class GoogleScholarScraper(ISearchEngine):
     
     def _extract_year_from_snippet(self, snippet: str) -> str:
         """Extract publication year from snippet"""
-        import re
         
         # Look for 4-digit years between 2000-2024
-        year_match = re.search(r'\b(20[0-2][0-9])\b', snippet)
+        year_match = _YEAR_RE.search(snippet)
         return year_match.group(1) if year_match else "Unknown"
     
     def _convert_to_search_results(self, raw_results: List[dict]) -> List[SearchResult]:
@@ -217,16 +286,8 @@ class GoogleScholarScraper(ISearchEngine):
         """Try to extract author names from snippet"""
         
         # Simple heuristic: look for patterns like "Author A, Author B"
-        import re
-        
-        # Look for author patterns (very basic)
-        author_patterns = [
-            r'([A-Z][a-z]+ [A-Z][a-z]+(?:, [A-Z][a-z]+ [A-Z][a-z]+)*)',
-            r'([A-Z]\. [A-Z][a-z]+(?:, [A-Z]\. [A-Z][a-z]+)*)'
-        ]
-        
-        for pattern in author_patterns:
-            match = re.search(pattern, snippet)
+        for pattern in _AUTHOR_PATTERNS:
+            match = pattern.search(snippet)
             if match:
                 authors_str = match.group(1)
                 return [author.strip() for author in authors_str.split(',')]
@@ -239,66 +300,104 @@ class GoogleScholarScraper(ISearchEngine):
         if not self.ai_enabled:
             return results
         
-        relevant_results = []
+        # Papers mentioning none of the keywords would be rejected anyway; skip the AI call
+        if keywords:
+            keyword_re = re.compile('|'.join(map(re.escape, keywords)), re.IGNORECASE)
+            results = [result for result in results if keyword_re.search(f"{result.title} {result.abstract}")]
         
-        for result in results:
-            try:
-                # Use AI to check relevance
-                is_relevant, score = self._check_relevance_with_ai(result, keywords)
-                
-                if is_relevant:
-                    result.relevance_score = score
-                    relevant_results.append(result)
-                
-                # Small delay to avoid API rate limits
-                time.sleep(0.1)
-                
-            except Exception as e:
-                print(f"Error checking relevance: {e}")
-                # If AI fails, include the paper anyway
-                result.relevance_score = 0.5
-                relevant_results.append(result)
+        # Reuse stored verdicts; only unseen papers go to Gemini
+        verdicts = {}
+        pending = []
+        for i, result in enumerate(results):
+            cached = llm_cache.get(self._relevance_cache_key(result, keywords), RELEVANCE_CACHE_VERSION)
+            if cached is not None:
+                is_relevant, score = cached.split('|')
+                verdicts[i] = (is_relevant == 'YES', float(score))
+            else:
+                pending.append(i)
+        
+        # Score unseen papers in batches, several batches at a time
+        batches = [pending[i:i + self._RELEVANCE_BATCH_SIZE] for i in range(0, len(pending), self._RELEVANCE_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            batch_verdicts = executor.map(
+                lambda batch: self._check_relevance_batch([results[i] for i in batch], keywords),
+                batches
+            )
+            for batch, batch_result in zip(batches, batch_verdicts):
+                verdicts.update(zip(batch, batch_result))
+        
+        relevant_results = [
+            replace(result, relevance_score=verdicts[i][1])
+            for i, result in enumerate(results)
+            if verdicts[i][0]
+        ]
         
         # Sort by relevance score
         relevant_results.sort(key=lambda x: x.relevance_score, reverse=True)
         
         return relevant_results
     
-    def _check_relevance_with_ai(self, result: SearchResult, keywords: List[str]) -> tuple[bool, float]:
-        """Use AI to check if paper is relevant"""
+    def _check_relevance_batch(self, results: List[SearchResult], keywords: List[str]) -> List[Tuple[bool, float]]:
+        """Use one AI call to check whether each paper in a batch is relevant"""
+        
+        papers = "\n".join(
+            f"{i}. TITLE: {result.title}\n   SNIPPET: {result.abstract}"
+            for i, result in enumerate(results, 1)
+        )
         
         prompt = f"""
-You are a medical research expert. Analyze this paper and determine if it's relevant to research on EGFR inhibitor nephrotoxicity.
+You are a medical research expert. Analyze these papers and determine which are relevant to research on EGFR inhibitor nephrotoxicity.
 
-Paper Title: {result.title}
-Abstract/Snippet: {result.abstract}
 Target Keywords: {', '.join(keywords)}
 
+Papers:
+{papers}
+
 Analysis Instructions:
-1. Is this paper about EGFR inhibitors (osimertinib, erlotinib, gefitinib, etc.) AND kidney/renal toxicity?
+1. Is the paper about EGFR inhibitors (osimertinib, erlotinib, gefitinib, etc.) AND kidney/renal toxicity?
 2. Or is it about targeted cancer therapy nephrotoxicity?
 3. Rate the relevance from 0-100
 
-Respond in this exact format:
-RELEVANT: YES/NO
-SCORE: [0-100]
-REASON: [brief explanation]
+Return one entry per paper: "i" is the paper number, "relevant" is true/false and "score" is 0-100.
 """
         
+        # Default to include if AI fails or skips a paper
+        verdicts = [(True, 0.5)] * len(results)
+        
         try:
-            # Use the AI checker (reusing GeminiKeywordExtractor's API method)
-            response = self.ai_checker._call_gemini_api(prompt)
-            
-            # Parse response
-            is_relevant = "YES" in response.upper()
+            # Use the AI checker's Gemini client with structured JSON output
+            self._AI_RATE_LIMITER.wait()
+            response = self.ai_checker._client.generate(
+                prompt,
+                generation_config={
+                    "temperature": 0.1,
+                    "responseMimeType": "application/json",
+                    "responseSchema": _RELEVANCE_SCHEMA
+                },
+                prompt_version=RELEVANCE_CACHE_VERSION
+            )
             
-            # Extract score
-            import re
-            score_match = re.search(r'SCORE:\s*(\d+)', response)
-            score = int(score_match.group(1)) / 100.0 if score_match else 0.5
-            
-            return is_relevant, score
+            for item in orjson.loads(response):
+                index = item.get('i', 0) - 1
+                if not 0 <= index < len(results):
+                    continue
+                
+                verdict = (bool(item.get('relevant')), int(item.get('score', 50)) / 100.0)
+                verdicts[index] = verdict
+                llm_cache.set(
+                    self._relevance_cache_key(results[index], keywords),
+                    f"{'YES' if verdict[0] else 'NO'}|{verdict[1]}",
+                    RELEVANCE_CACHE_VERSION
+                )
             
         except Exception as e:
             print(f"AI relevance check failed: {e}")
-            return True, 0.5  # Default to include if AI fails
+        
+        return verdicts
+    
+    def _relevance_cache_key(self, result: SearchResult, keywords: List[str]) -> str:
+        """Cache key from the normalized title and the keyword set"""
+        
+        title = normalize_title(result.title_lc)
+        keyword_set = sorted({keyword.lower().strip() for keyword in keywords})
+        return f"{title}|{'|'.join(keyword_set)}"
@@ -0,0 +1,203 @@
+import math
+import os
+import orjson
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import requests
+
+# Gemini embedding endpoint used to compare questions by meaning
+EMBED_URL = "https://generativelanguage.googleapis.com/v1beta/models/text-embedding-004:embedContent"
+
+# text-embedding-004 rates same-topic questions above 0.9 even when they name a
+# different drug, so only near-paraphrases count as a hit
+SIMILARITY_THRESHOLD = 0.95
+
+# Entries live as long as LLM cache entries, and the oldest go first past the size cap
+CACHE_TTL = 7 * 24 * 3600  # 7 days
+MAX_ENTRIES = 1000
+
+class SemanticCache:
+    """Cache that returns a stored value for paraphrases of a previous question"""
+
+    def __init__(self, api_key: str, path: str, session: requests.Session, threshold: float = SIMILARITY_THRESHOLD,
+                 ttl: float = CACHE_TTL, max_entries: int = MAX_ENTRIES):
+        self.api_key = api_key
+        self.path = path
+        self.session = session
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._positions: Dict[str, int] = {}
+        self._texts: List[str] = []
+        self._vectors: List[List[float]] = []
+        self._values: List[Any] = []
+        self._created: List[float] = []
+        self._embedding_memo = {}
+        # Lines in the append-only file, including superseded and evicted entries
+        self._file_lines = 0
+        self._load()
+
+    def get(self, text: str) -> Optional[Any]:
+        """Return the value of the most similar stored question above threshold"""
+
+        key = self._normalize(text)
+
+        with self._lock:
+            self._prune()
+
+            # Exact repeats never need an embedding round-trip
+            if key in self._positions:
+                return self._values[self._positions[key]]
+            if not self._vectors:
+                return None
+
+        vector = self._embed(key)
+
+        with self._lock:
+            best_score, best_index = -1.0, -1
+            for i, stored in enumerate(self._vectors):
+                score = sum(a * b for a, b in zip(vector, stored))
+                if score > best_score:
+                    best_score, best_index = score, i
+
+            if best_score > self.threshold:
+                return self._values[best_index]
+
+        return None
+
+    def put(self, text: str, value: Any) -> None:
+        """Store a value for a question"""
+
+        key = self._normalize(text)
+        vector = self._embed(key)
+
+        with self._lock:
+            if key in self._positions:
+                return
+            self._positions[key] = len(self._texts)
+            self._texts.append(key)
+            self._vectors.append(vector)
+            self._values.append(value)
+            self._created.append(time.time())
+            self._prune()
+            self._append()
+
+    def _embed(self, text: str) -> List[float]:
+        """Embed text with Gemini and L2-normalize it so dot product is cosine"""
+
+        if text in self._embedding_memo:
+            return self._embedding_memo[text]
+
+        response = self.session.post(
+            EMBED_URL,
+            headers={
+                'Content-Type': 'application/json',
+                'X-goog-api-key': self.api_key
+            },
+            data=orjson.dumps({
+                "model": "models/text-embedding-004",
+                "content": {"parts": [{"text": text}]}
+            }),
+            timeout=15
+        )
+
+        if response.status_code != 200:
+            raise Exception(f"Embedding call failed: {response.status_code} - {response.text}")
+
+        values = orjson.loads(response.content)['embedding']['values']
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        vector = [v / norm for v in values]
+
+        # Remember only the latest embedding so a miss followed by put embeds once
+        self._embedding_memo = {text: vector}
+
+        return vector
+
+    def _normalize(self, text: str) -> str:
+        """Normalize whitespace and case before comparing"""
+        return " ".join(text.lower().split())
+
+    def _load(self) -> None:
+        """Load stored entries from the JSON Lines file"""
+
+        entries = {}
+        try:
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    self._file_lines += 1
+                    try:
+                        entry = orjson.loads(line)
+                    except ValueError:
+                        continue  # A line cut short by a crash mid-append
+                    # A re-added question supersedes its earlier line
+                    entries.pop(entry['text'], None)
+                    entries[entry['text']] = entry
+        except OSError:
+            return
+
+        for entry in entries.values():
+            self._positions[entry['text']] = len(self._texts)
+            self._texts.append(entry['text'])
+            self._vectors.append(entry['vector'])
+            self._values.append(entry['value'])
+            self._created.append(entry['created_at'])
+
+        self._prune()
+
+    def _prune(self) -> None:
+        """Drop expired entries, then the oldest beyond max_entries (caller holds the lock)"""
+
+        # Entries are appended in creation order, so expired ones form a prefix
+        cutoff = time.time() - self.ttl
+        start = 0
+        while start < len(self._created) and self._created[start] < cutoff:
+            start += 1
+        start = max(start, len(self._texts) - self.max_entries)
+
+        if start <= 0:
+            return
+
+        del self._texts[:start], self._vectors[:start], self._values[:start], self._created[:start]
+        self._positions = {text: i for i, text in enumerate(self._texts)}
+
+    def _append(self) -> None:
+        """Append the newest entry to the file, compacting it once stale lines dominate (caller holds the lock)"""
+
+        stale = self._file_lines - len(self._texts)
+        if stale > max(len(self._texts), 100):
+            self._save()
+            return
+
+        entry = {
+            'text': self._texts[-1],
+            'vector': self._vectors[-1],
+            'value': self._values[-1],
+            'created_at': self._created[-1]
+        }
+
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'ab') as f:
+                f.write(orjson.dumps(entry, option=orjson.OPT_APPEND_NEWLINE))
+            self._file_lines += 1
+        except OSError as e:
+            print(f"⚠️ Could not save semantic cache: {e}")
+
+    def _save(self) -> None:
+        """Rewrite the file with only the live entries (caller holds the lock)"""
+
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                for entry in zip(self._texts, self._vectors, self._values, self._created):
+                    f.write(orjson.dumps(
+                        dict(zip(('text', 'vector', 'value', 'created_at'), entry)),
+                        option=orjson.OPT_APPEND_NEWLINE
+                    ))
+            os.replace(tmp_path, self.path)
+            self._file_lines = len(self._texts)
+        except OSError as e:
+            print(f"⚠️ Could not save semantic cache: {e}")
@@ -0,0 +1,13 @@
+import re
+
+# Punctuation/whitespace runs collapsed when comparing titles
+_NON_WORD_RE = re.compile(r'[\W_]+')
+
+def normalize_title(title: str) -> str:
+    """Lowercase a title and collapse punctuation and whitespace, so near-identical titles compare equal"""
+    return _NON_WORD_RE.sub(' ', title.lower()).strip()
+
+def trim_oldest(cache: dict, max_size: int) -> None:
+    """Drop an insertion-ordered dict's oldest entries until it holds at most max_size"""
+    while len(cache) > max_size:
+        del cache[next(iter(cache))]
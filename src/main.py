@@ -1,62 +1,198 @@
 import gradio as gr
 import os
+import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+from dataclasses import replace
+from functools import cached_property, lru_cache
+from itertools import chain
+from typing import Iterable, Iterator
 from dotenv import load_dotenv
-from core.interfaces import ResearchQuery
+from core.interfaces import ResearchQuery, SearchResult
 
 # Load environment variables
 load_dotenv()
 from core.implementations import SimpleContentAnalyzer, SimpleReportGenerator
 from core.ai_implementations import GeminiKeywordExtractor, GeminiSourceRecommender
 from core.pubmed_search import PubMedSearchEngine
+from core.utils import normalize_title, trim_oldest
 from core.gemini_search import GeminiNativeSearchEngine
 
+# Maximum number of source searches in flight at once
+PARALLEL_REQUESTS = int(os.getenv('PARALLEL_REQUESTS', '4'))
+
+# Seconds to wait for all sources before reporting on whatever has arrived
+SEARCH_TIMEOUT = int(os.getenv('SEARCH_TIMEOUT', '30'))
+
+# Analyzer results are reused for a day, for up to this many papers
+ANALYSIS_CACHE_TTL = 24 * 3600
+ANALYSIS_CACHE_SIZE = 4096
+
+# Static report skeleton, parsed once at import
+REPORT_HEADER_TEMPLATE = string.Template("""
+# Research Report ($ai_status)
+
+## Query Summary
+- **Original Question**: $question
+- **Keywords Used**: $keywords
+- **Sources Searched**: $sources
+
+## Results Overview
+- **Total Papers Found**: $total
+- **Relevant Papers**: $relevant
+- **Evidence Level**: $evidence
+
+## Summary
+$summary
+
+## Key Findings
+""")
+
+# Markdown block for one paper in the report
+PAPER_TEMPLATE = (
+    "- **{title}** ({journal}, {date})\n"
+    "  - Authors: {authors}\n"
+    "  - Type: {type}\n"
+    "  - Relevance Score: {score:.2f}\n\n"
+)
+
+# Seconds a processed question's keywords/sources are reused from memory, for up to this many questions
+QUERY_CACHE_TTL = int(os.getenv('QUERY_CACHE_TTL', '3600'))
+QUERY_CACHE_SIZE = 256
+
 class ResearchAgentService:
     """Main research agent service with AI integration"""
     
-    def __init__(self):
-        # Initialize with AI-powered components
-        try:
-            self.keyword_extractor = GeminiKeywordExtractor()
-            self.source_recommender = GeminiSourceRecommender()
-            self.ai_enabled = True
-        except ValueError as e:
-            print(f"⚠️  AI components failed to initialize: {e}")
+    def __init__(self, ai: bool = True):
+        # AI components need a Gemini key; they and the search engines are built on first use
+        self.ai_enabled = ai and bool(os.getenv('GEMINI_API_KEY'))
+        if not ai:
+            print("📝 AI disabled, using simple implementations")
+        elif not self.ai_enabled:
+            print("⚠️  AI components unavailable: GEMINI_API_KEY environment variable is required")
             print("📝 Falling back to simple implementations")
-            # Fallback to simple implementations
-            from core.implementations import SimpleKeywordExtractor, SimpleSourceRecommender
-            self.keyword_extractor = SimpleKeywordExtractor()
-            self.source_recommender = SimpleSourceRecommender()
-            self.ai_enabled = False
-        
-        # Initialize search engines with Gemini native search
-        try:
-            self.search_engines = {
-                "PubMed": PubMedSearchEngine(),
-                "Google Scholar": GeminiNativeSearchEngine(),
-                "Academic Search": GeminiNativeSearchEngine()
-            }
-        except Exception as e:
-            print(f"⚠️ Gemini search initialization failed: {e}")
-            self.search_engines = {
-                "PubMed": PubMedSearchEngine()
-            }
+        
+        # Search engines with Gemini native search, constructed lazily by _get_engine;
+        # Google Scholar and Academic Search are both served by one Gemini engine
+        self._engine_factories = {
+            "PubMed": PubMedSearchEngine,
+            "Google Scholar": GeminiNativeSearchEngine,
+            "Academic Search": GeminiNativeSearchEngine
+        }
+        self._engines = {}
+        self._engine_lock = threading.Lock()
+        
         self.content_analyzer = SimpleContentAnalyzer()
         self.report_generator = SimpleReportGenerator()
+        
+        # Normalized question -> (expires_at, keywords, sources)
+        self._query_cache = {}
+        
+        # (title, abstract, keywords) -> (expires_at, relevance score, paper type)
+        self._analysis_cache = {}
+        
+        # Gradio runs handlers on several threads; guards both caches above
+        self._cache_lock = threading.Lock()
+    
+    @cached_property
+    def keyword_extractor(self):
+        """Keyword extractor, AI-powered when a Gemini key is configured"""
+        if self.ai_enabled:
+            return GeminiKeywordExtractor()
+        from core.implementations import SimpleKeywordExtractor
+        return SimpleKeywordExtractor()
+    
+    @cached_property
+    def source_recommender(self):
+        """Source recommender, AI-powered when a Gemini key is configured"""
+        if self.ai_enabled:
+            return GeminiSourceRecommender()
+        from core.implementations import SimpleSourceRecommender
+        return SimpleSourceRecommender()
+    
+    def _get_engine(self, source: str):
+        """Return the search engine for a source, building it on first use (None if unavailable)"""
+        
+        with self._engine_lock:
+            if source not in self._engines:
+                factory = self._engine_factories.get(source)
+                if factory is None:
+                    return None
+                try:
+                    engine = factory()
+                except Exception as e:
+                    print(f"⚠️ {source} search initialization failed: {e}")
+                    return None
+                # Sources served by the same engine class share one instance and its caches
+                for other, other_factory in self._engine_factories.items():
+                    if other_factory is factory:
+                        self._engines.setdefault(other, engine)
+            return self._engines[source]
+    
+    def warm_up(self) -> None:
+        """Build components and open pooled connections before the first query"""
+        
+        self.keyword_extractor
+        self.source_recommender
+        for source in self._engine_factories:
+            self._get_engine(source)
+        
+        warmers = []
+        pubmed = self._get_engine("PubMed")
+        if pubmed is not None:
+            warmers.append(("PubMed", pubmed.warm_up))
+        # Every Gemini component shares one connection pool, so one request warms them all
+        if self.ai_enabled:
+            warmers.append(("Gemini", self.keyword_extractor._client.warm_up))
+        
+        for name, warm_up in warmers:
+            try:
+                warm_up()
+            except Exception as e:
+                print(f"⚠️ {name} warm-up failed: {e}")
     
     def process_query(self, question: str) -> tuple:
         """Process research query and return results"""
         
+        # Repeated questions skip both AI steps. Paraphrases are handled further down:
+        # the keyword extractor has a semantic cache, and the same keywords then hit
+        # the recommender's on-disk prompt cache.
+        key = " ".join(question.lower().split())
+        with self._cache_lock:
+            cached = self._query_cache.get(key)
+        if cached and cached[0] > time.time():
+            return list(cached[1]), list(cached[2])
+        
         # Step 1: Extract keywords using AI
         keywords = self.keyword_extractor.extract_keywords(question)
         
         # Step 2: Recommend sources using AI
         sources = self.source_recommender.recommend_sources(keywords)
         
+        # Defaults returned while Gemini is failing must not outlive the outage
+        if self.keyword_extractor.used_fallback() or self.source_recommender.used_fallback():
+            return keywords, sources
+        
+        # Re-insert so a refreshed question counts as the newest entry
+        with self._cache_lock:
+            self._query_cache.pop(key, None)
+            self._query_cache[key] = (time.time() + QUERY_CACHE_TTL, list(keywords), list(sources))
+            trim_oldest(self._query_cache, QUERY_CACHE_SIZE)
+        
         return keywords, sources
     
     def execute_search(self, question: str, confirmed_keywords: str, confirmed_sources: str) -> str:
         """Execute the actual search and generate report"""
         
+        output = ""
+        for output in self.execute_search_stream(question, confirmed_keywords, confirmed_sources):
+            pass
+        return output
+    
+    def execute_search_stream(self, question: str, confirmed_keywords: str, confirmed_sources: str) -> Iterator[str]:
+        """Execute the search, yielding progress markdown as sources finish and then the full report"""
+        
         # Parse confirmed inputs
         keywords = [k.strip() for k in confirmed_keywords.split(',')]
         sources = [s.strip() for s in confirmed_sources.split(',')]
@@ -68,63 +204,163 @@ class ResearchAgentService:
             sources=sources
         )
         
-        # Execute search
-        all_results = []
+        ai_status = "🤖 AI-Powered" if self.ai_enabled else "📝 Simple Mode"
+        progress = [f"\n# Research Report ({ai_status})\n\n⏳ Searching {', '.join(sources)}...\n\n"]
+        
+        # Group sources by engine so an engine can serve several sources in one call
+        engine_sources = {}
         for source in sources:
-            if source in self.search_engines:
+            engine = self._get_engine(source)
+            if engine is not None:
                 print(f"🔍 Searching {source}...")
-                results = self.search_engines[source].search(keywords, source, limit=20)
-                all_results.extend(results)
+                engine_sources.setdefault(id(engine), (engine, []))[1].append(source)
             else:
                 print(f"⚠️ Search engine not available for: {source}")
+                progress.append(f"- ⚠️ {source}: search engine not available\n")
+        
+        yield "".join(progress)
+        
+        # Execute search (engines are I/O-bound, so run them concurrently;
+        # wall time is the slowest engine rather than the sum of all of them)
+        results_by_source = {}
+        if engine_sources:
+            executor = ThreadPoolExecutor(max_workers=min(PARALLEL_REQUESTS, len(engine_sources)))
+            futures = {
+                executor.submit(engine.search_multi, keywords, group, limit=20): group
+                for engine, group in engine_sources.values()
+            }
+            try:
+                # Show each engine's count as soon as it finishes, up to an overall deadline
+                for future in as_completed(futures, timeout=SEARCH_TIMEOUT):
+                    try:
+                        engine_results = future.result()
+                    except Exception as e:
+                        print(f"❌ Search failed for {', '.join(futures[future])}: {e}")
+                        progress.extend(f"- ❌ {source}: search failed\n" for source in futures[future])
+                    else:
+                        results_by_source.update(engine_results)
+                        progress.extend(
+                            f"- ✅ {source}: {len(results)} papers\n" for source, results in engine_results.items()
+                        )
+                    yield "".join(progress)
+            except FuturesTimeoutError:
+                late = [source for future, group in futures.items() if not future.done() for source in group]
+                print(f"⏱️ Search deadline reached, skipping: {', '.join(late)}")
+                progress.extend(f"- ⏱️ {source}: timed out\n" for source in late)
+                yield "".join(progress)
+            finally:
+                # Report on what arrived in time; stragglers finish in the background
+                executor.shutdown(wait=False, cancel_futures=True)
+        
+        # The same paper often comes back from several sources; analyze and report it once
+        all_results = list(self._iter_unique(
+            chain.from_iterable(results_by_source.get(source, ()) for source in sources)
+        ))
         
         # Analyze results
-        for result in all_results:
-            result.relevance_score = self.content_analyzer.analyze_relevance(result, query)
-            result.result_type = self.content_analyzer.classify_paper_type(result)
+        all_results = self._analyze_results(all_results, query)
         
         # Generate report
         report = self.report_generator.generate_report(query, all_results)
         
-        # Format output
-        ai_status = "🤖 AI-Powered" if self.ai_enabled else "📝 Simple Mode"
+        yield self._format_report(report, ai_status)
+    
+    def _format_report(self, report, ai_status: str) -> str:
+        """Render a research report as markdown"""
         
-        output = f"""
-# Research Report ({ai_status})
-
-## Query Summary
-- **Original Question**: {report.query.original_question}
-- **Keywords Used**: {', '.join(report.query.keywords)}
-- **Sources Searched**: {', '.join(report.query.sources)}
-
-## Results Overview
-- **Total Papers Found**: {report.total_papers_found}
-- **Relevant Papers**: {len(report.relevant_papers)}
-- **Evidence Level**: {report.evidence_level}
-
-## Summary
-{report.summary}
-
-## Key Findings
-"""
-        for i, finding in enumerate(report.key_findings, 1):
-            output += f"{i}. {finding}\n"
+        header = REPORT_HEADER_TEMPLATE.substitute(
+            ai_status=ai_status,
+            question=report.query.original_question,
+            keywords=', '.join(report.query.keywords),
+            sources=', '.join(report.query.sources),
+            total=report.total_papers_found,
+            relevant=report.relevant_count if report.relevant_count is not None else len(report.relevant_papers),
+            evidence=report.evidence_level,
+            summary=report.summary
+        )
+        # Collect the pieces and join once instead of growing one string
+        parts = [header]
+        parts.extend(f"{i}. {finding}\n" for i, finding in enumerate(report.key_findings, 1))
+        
+        parts.append("\n## Recommendations\n")
+        parts.extend(f"{i}. {rec}\n" for i, rec in enumerate(report.recommendations, 1))
         
-        output += "\n## Recommendations\n"
-        for i, rec in enumerate(report.recommendations, 1):
-            output += f"{i}. {rec}\n"
+        parts.append("\n## Relevant Papers\n")
+        parts.extend(
+            PAPER_TEMPLATE.format(
+                title=paper.title,
+                journal=paper.journal,
+                date=paper.publication_date,
+                authors=', '.join(paper.authors),
+                type=paper.result_type.value,
+                score=paper.relevance_score
+            )
+            for paper in report.relevant_papers
+        )
         
-        output += "\n## Relevant Papers\n"
-        for paper in report.relevant_papers:
-            output += f"- **{paper.title}** ({paper.journal}, {paper.publication_date})\n"
-            output += f"  - Authors: {', '.join(paper.authors)}\n"
-            output += f"  - Type: {paper.result_type.value}\n"
-            output += f"  - Relevance Score: {paper.relevance_score:.2f}\n\n"
+        return "".join(parts)
+    
+    def _iter_unique(self, results: Iterable[SearchResult]) -> Iterator[SearchResult]:
+        """Yield results, skipping any that share a DOI, PMID or normalized title with an earlier one"""
         
-        return output
+        seen = set()
+        for result in results:
+            # Only real identifiers count; Gemini fills gaps with placeholders like "N/A"
+            keys = set()
+            doi = (result.doi or '').strip().lower()
+            if doi.startswith('10.'):
+                keys.add(('doi', doi))
+            pmid = (result.pmid or '').strip()
+            if pmid.isdigit():
+                keys.add(('pmid', pmid))
+            title = normalize_title(result.title_lc)
+            if title and title != 'unknown title':
+                keys.add(('title', title))
+            
+            if keys & seen:
+                continue
+            seen |= keys
+            yield result
+    
+    def _analyze_results(self, results: list, query: ResearchQuery) -> list:
+        """Score and classify results, reusing earlier analysis of the same paper and keywords"""
+        
+        # Scores depend on the keyword multiset, not its order or case
+        keyword_key = tuple(sorted(k.lower() for k in query.keywords))
+        now = time.time()
+        
+        analyzed = [None] * len(results)
+        pending = []
+        with self._cache_lock:
+            for i, result in enumerate(results):
+                entry = self._analysis_cache.get((result.title_lc, result.abstract_lc, keyword_key))
+                if entry and entry[0] > now:
+                    analyzed[i] = entry[1:]
+                else:
+                    pending.append(i)
+        
+        if pending:
+            to_analyze = [results[i] for i in pending]
+            scores = self.content_analyzer.analyze_relevance_batch(to_analyze, query)
+            paper_types = self.content_analyzer.classify_paper_type_batch(to_analyze)
+            expires_at = now + ANALYSIS_CACHE_TTL
+            
+            with self._cache_lock:
+                for i, result, score, paper_type in zip(pending, to_analyze, scores, paper_types):
+                    self._analysis_cache[(result.title_lc, result.abstract_lc, keyword_key)] = (expires_at, score, paper_type)
+                    analyzed[i] = (score, paper_type)
+                
+                trim_oldest(self._analysis_cache, ANALYSIS_CACHE_SIZE)
+        
+        return [
+            replace(result, relevance_score=score, result_type=paper_type)
+            for result, (score, paper_type) in zip(results, analyzed)
+        ]
 
-# Initialize service
-agent = ResearchAgentService()
+@lru_cache(maxsize=1)
+def get_agent() -> ResearchAgentService:
+    """Return the shared service, built once per process (ENABLE_AI=false forces simple mode)"""
+    return ResearchAgentService(ai=os.getenv('ENABLE_AI', 'true').lower() not in ('0', 'false', 'no'))
 
 def step1_extract_keywords(question):
     """Step 1: Extract and show keywords using AI"""
@@ -132,7 +368,7 @@ def step1_extract_keywords(question):
         return "", ""
     
     try:
-        keywords, sources = agent.process_query(question)
+        keywords, sources = get_agent().process_query(question)
         keywords_str = ', '.join(keywords)
         sources_str = ', '.join(sources)
         
@@ -141,18 +377,18 @@ def step1_extract_keywords(question):
         return f"Error: {str(e)}", ""
 
 def step2_generate_report(question, keywords, sources):
-    """Step 2: Generate final report"""
+    """Step 2: Generate final report, streaming progress while sources are searched"""
     if not all([question.strip(), keywords.strip(), sources.strip()]):
-        return "Please fill in all fields from Step 1 first."
+        yield "Please fill in all fields from Step 1 first."
+        return
     
     try:
-        report = agent.execute_search(question, keywords, sources)
-        return report
+        yield from get_agent().execute_search_stream(question, keywords, sources)
     except Exception as e:
-        return f"Error generating report: {str(e)}"
+        yield f"Error generating report: {str(e)}"
 
 # Create Gradio interface
-ai_status_text = "🤖 AI-Powered Mode" if agent.ai_enabled else "📝 Simple Mode (Set GEMINI_API_KEY to enable AI)"
+ai_status_text = "🤖 AI-Powered Mode" if get_agent().ai_enabled else "📝 Simple Mode (Set GEMINI_API_KEY to enable AI)"
 
 with gr.Blocks(title="EGFR Research Agent") as demo:
     gr.Markdown("# 🔬 EGFR Research Agent")
@@ -206,4 +442,10 @@ if __name__ == "__main__":
     # Environment variables are loaded automatically from .env file
     # No need to set API key manually - it's loaded from .env
     
+    # Let several users' searches run at once instead of one at a time;
+    # handlers are sync, so Gradio runs them on its worker threads
+    demo.queue(max_size=32, default_concurrency_limit=8)
+    
+    # Open connections while the UI starts so the first click does not pay for them
+    threading.Thread(target=get_agent().warm_up, daemon=True).start()
     demo.launch(share=True)
@@ -1,6 +1,12 @@
 import os
 from dotenv import load_dotenv
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+
+# Pooled session so repeated checks reuse one TLS connection
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=10))
 
 def test_gemini_api():
     """Test if Gemini API is working"""
@@ -38,12 +44,12 @@ def test_gemini_api():
     
     try:
         print("🌐 Testing API connection...")
-        response = requests.post(url, headers=headers, json=data, timeout=10)
+        response = _SESSION.post(url, headers=headers, data=orjson.dumps(data), timeout=10)
         
         print(f"📊 Response Status: {response.status_code}")
         
         if response.status_code == 200:
-            result = response.json()
+            result = orjson.loads(response.content)
             if 'candidates' in result:
                 ai_response = result['candidates'][0]['content']['parts'][0]['text']
                 print(f"✅ AI Response: {ai_response}")
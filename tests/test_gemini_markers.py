@@ -0,0 +1,51 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.gemini_search import GeminiNativeSearchEngine
+
+def _papers(count, start=0):
+    return "".join(
+        f"PAPER_START\nTitle: Nephrotoxicity paper number {n}\nPMID: {n}\nPAPER_END\n"
+        for n in range(start, start + count)
+    )
+
+def _parse(text, sources, limit):
+    engine = GeminiNativeSearchEngine(api_key="test-key")
+    return list(engine._iter_marked_papers(text, sources, limit))
+
+def test_marker_parser_respects_limit():
+    """Each source stops at the limit, even when it appears in several groups"""
+
+    text = (
+        f"SOURCE_START: PubMed\n{_papers(2)}SOURCE_END\n"
+        f"SOURCE_START: [Google Scholar]\n{_papers(1, 10)}SOURCE_END\n"
+        f"SOURCE_START: pubmed\n{_papers(3, 20)}SOURCE_END"
+    )
+
+    pairs = _parse(text, ["PubMed", "Google Scholar"], limit=3)
+
+    assert [(source, result.pmid) for source, result in pairs] == [
+        ("PubMed", "0"), ("PubMed", "1"), ("Google Scholar", "10"), ("PubMed", "20")
+    ]
+
+def test_missing_source_markers_go_to_first_source():
+    """Without SOURCE markers every paper is attributed to the first source, up to the limit"""
+
+    pairs = _parse(_papers(5), ["Google Scholar", "PubMed"], limit=2)
+
+    assert [(source, result.pmid) for source, result in pairs] == [("Google Scholar", "0"), ("Google Scholar", "1")]
+
+def test_unmarked_text_uses_fallback_patterns():
+    """Plain "Title:" blocks without any markers are still parsed"""
+
+    text = (
+        "Title: Acute kidney injury with osimertinib\nYear: 2023\n\n"
+        "Title: Erlotinib and glomerulonephritis\nYear: 2022\n"
+    )
+
+    pairs = _parse(text, ["PubMed"], limit=5)
+
+    assert [result.title for _, result in pairs] == [
+        "Acute kidney injury with osimertinib", "Erlotinib and glomerulonephritis"
+    ]
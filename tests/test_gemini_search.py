@@ -0,0 +1,158 @@
+import sys
+import os
+import json
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core import llm_cache
+from core.ai_implementations import _GeminiClient
+from core.gemini_search import GeminiNativeSearchEngine
+
+SOURCES = ["PubMed", "Google Scholar"]
+
+def _paper(source, n):
+    """Build a structured-output paper object"""
+    return {
+        "source": source,
+        "title": f"EGFR inhibitor nephrotoxicity study {n}",
+        "authors": ["Smith J", "Doe A"],
+        "journal": "Kidney International",
+        "year": "2023",
+        "pmid": str(1000 + n),
+        "abstract": "Abstract text with a } brace and a { brace inside",
+        "type": "case_report"
+    }
+
+def _parse(chunks, sources=SOURCES, limit=20):
+    engine = GeminiNativeSearchEngine(api_key="test-key")
+    return list(engine._iter_streamed_papers(chunks, sources, limit))
+
+def test_objects_split_across_chunks():
+    """Papers split at arbitrary points, including inside strings with braces, still parse"""
+
+    text = json.dumps([_paper("PubMed", 1), _paper("Google Scholar", 2), _paper("pubmed", 3)])
+    chunks = [text[i:i + 7] for i in range(0, len(text), 7)]
+
+    pairs = _parse(chunks)
+
+    assert [source for source, _ in pairs] == ["PubMed", "Google Scholar", "PubMed"]
+    assert [result.pmid for _, result in pairs] == ["1001", "1002", "1003"]
+    assert pairs[0][1].abstract == "Abstract text with a } brace and a { brace inside"
+    assert pairs[0][1].authors == ["Smith J", "Doe A"]
+
+def test_truncated_array_keeps_complete_papers():
+    """A response cut off mid-array yields every paper that completed"""
+
+    text = json.dumps([_paper("PubMed", 1), _paper("Google Scholar", 2)])
+    truncated = text[:text.rindex('"abstract"')]
+
+    pairs = _parse(["  \n", truncated[:50], truncated[50:]])
+
+    assert [(source, result.pmid) for source, result in pairs] == [("PubMed", "1001")]
+
+def test_unknown_source_dropped():
+    """Papers naming a source that was not requested are skipped"""
+
+    text = json.dumps([_paper("Embase", 1), _paper("PubMed", 2)])
+
+    pairs = _parse([text])
+
+    assert [source for source, _ in pairs] == ["PubMed"]
+
+def test_non_json_falls_back_to_markers():
+    """Plain-text responses go through the SOURCE/PAPER marker parser"""
+
+    text = """SOURCE_START: Google Scholar
+PAPER_START
+Title: [Acute glomerulonephritis with osimertinib]
+Authors: Smith J, Doe A
+Journal: Kidney International
+Year: 2022
+PMID: 123456
+Abstract: First line
+continued abstract
+Type: case report
+PAPER_END
+SOURCE_END
+"""
+
+    pairs = _parse(["SOURCE_START", text[len("SOURCE_START"):]])
+
+    assert len(pairs) == 1
+    source, result = pairs[0]
+    assert source == "Google Scholar"
+    assert result.title == "Acute glomerulonephritis with osimertinib"
+    assert result.url == "https://pubmed.ncbi.nlm.nih.gov/123456/"
+    assert result.abstract == "First line\ncontinued abstract"
+    assert result.result_type.value == "case_report"
+
+class _FakeResponse:
+    """Streamed SSE response made of the given text chunks"""
+
+    status_code = 200
+
+    def __init__(self, chunks, finish_reason):
+        self.lines = [
+            b"data: " + json.dumps({"candidates": [{"content": {"parts": [{"text": chunk}]}}]}).encode()
+            for chunk in chunks
+        ]
+        self.lines.append(b"data: " + json.dumps({"candidates": [{"finishReason": finish_reason}]}).encode())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def iter_lines(self):
+        yield from self.lines
+
+class _FakeSession:
+    """Session whose streamed POSTs return a canned Gemini response"""
+
+    def __init__(self, chunks, finish_reason="STOP"):
+        self.chunks = chunks
+        self.finish_reason = finish_reason
+        self.calls = 0
+
+    def post(self, *args, **kwargs):
+        self.calls += 1
+        return _FakeResponse(self.chunks, self.finish_reason)
+
+def _search_twice(monkeypatch, tmp_path, session, limit):
+    monkeypatch.setattr(llm_cache, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(_GeminiClient, '_SESSION', session)
+    engine = GeminiNativeSearchEngine(api_key="test-key")
+    return [engine.search_multi(["EGFR"], ["PubMed"], limit=limit) for _ in range(2)]
+
+def test_search_stopped_early_is_cached(monkeypatch, tmp_path):
+    """Stopping at the limit still caches what was read, so a repeat makes no call"""
+
+    text = json.dumps([_paper("PubMed", n) for n in range(4)])
+    session = _FakeSession([text[i:i + 40] for i in range(0, len(text), 40)])
+
+    first, second = _search_twice(monkeypatch, tmp_path, session, limit=2)
+
+    assert session.calls == 1
+    assert [r.pmid for r in first["PubMed"]] == [r.pmid for r in second["PubMed"]] == ["1000", "1001"]
+
+def test_complete_search_is_cached(monkeypatch, tmp_path):
+    """A response that finished normally is served from the cache next time"""
+
+    session = _FakeSession([json.dumps([_paper("PubMed", 1)])])
+
+    first, second = _search_twice(monkeypatch, tmp_path, session, limit=5)
+
+    assert session.calls == 1
+    assert len(first["PubMed"]) == len(second["PubMed"]) == 1
+
+def test_truncated_search_is_not_cached(monkeypatch, tmp_path):
+    """A response cut off by maxOutputTokens is used once but not cached"""
+
+    text = json.dumps([_paper("PubMed", 1), _paper("PubMed", 2)])
+    session = _FakeSession([text[:text.rindex('"abstract"')]], finish_reason="MAX_TOKENS")
+
+    first, second = _search_twice(monkeypatch, tmp_path, session, limit=5)
+
+    assert session.calls == 2
+    assert len(first["PubMed"]) == len(second["PubMed"]) == 1
+    assert not os.listdir(tmp_path)
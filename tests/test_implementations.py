@@ -0,0 +1,69 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import pytest
+from core import implementations
+from core.implementations import SimpleContentAnalyzer, match_medical_keywords
+from core.interfaces import ResearchQuery, SearchResult, SearchResultType
+
+def _naive_match(question, dictionary):
+    """Reference: every dictionary term contained in the question"""
+    return [k for k in dictionary if k.lower() in question.lower()]
+
+def test_match_medical_keywords_default_dictionary():
+    """Terms come back in dictionary order, matched case-insensitively"""
+
+    question = "Renal injury and acute GLOMERULONEPHRITIS with osimertinib"
+
+    assert match_medical_keywords(question) == ["osimertinib", "glomerulonephritis", "acute", "renal"]
+    assert match_medical_keywords("unrelated question") == []
+
+def test_match_medical_keywords_terms_sharing_a_start(monkeypatch):
+    """Terms that start where a longer one does are still found"""
+
+    dictionary = ("EGFR inhibitor", "EGFR", "nephritis", "glomerulonephritis", "renal", "adrenal")
+    monkeypatch.setattr(implementations, 'MEDICAL_KEYWORDS', dictionary)
+
+    for question in (
+        "egfr inhibitor nephritis",
+        "EGFR-associated glomerulonephritis",
+        "adrenal and renal effects of an EGFR inhibitor",
+    ):
+        assert match_medical_keywords(question) == _naive_match(question, dictionary)
+
+def _result(title, abstract):
+    return SearchResult(
+        title=title,
+        authors=["Smith J"],
+        journal="J",
+        publication_date="2024",
+        doi=None,
+        pmid=None,
+        url="",
+        abstract=abstract,
+        result_type=SearchResultType.OTHER,
+        relevance_score=0.0
+    )
+
+def test_relevance_batch_matches_single_scoring():
+    """Batch scoring gives the same score as scoring each paper alone"""
+
+    analyzer = SimpleContentAnalyzer()
+    results = [
+        _result("Osimertinib-induced acute glomerulonephritis", "Renal biopsy after EGFR inhibitor therapy"),
+        _result("EGFR inhibitors and kidney injury", "nephrotoxicity nephrotoxicity"),
+        _result("Adrenal findings", "Nothing relevant here"),
+        _result("Renal renal RENAL", ""),
+        _result("Unrelated", "Acute kidney injury with EGFR inhibitor and osimertinib, glomerulonephritis"),
+    ]
+    queries = [
+        ResearchQuery("q", ["osimertinib", "glomerulonephritis", "acute"], ["PubMed"]),
+        ResearchQuery("q", ["EGFR inhibitor", "EGFR", "renal", "nephrotoxicity"], ["PubMed"]),
+        ResearchQuery("q", ["Renal", "renal", "kidney", "acute", "EGFR inhibitor", "osimertinib"], ["PubMed"]),
+        ResearchQuery("q", [], ["PubMed"]),
+    ]
+
+    for query in queries:
+        expected = [analyzer.analyze_relevance(result, query) for result in results]
+        assert analyzer.analyze_relevance_batch(results, query) == pytest.approx(expected)
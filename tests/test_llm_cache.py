@@ -0,0 +1,77 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import pytest
+from core import llm_cache
+
+class _Clock:
+    """Stand-in for time.time that tests can move forward"""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(llm_cache, '_last_sweep', 0.0)
+    return tmp_path
+
+def test_round_trip_and_expiry(cache_dir, monkeypatch):
+    """Entries are keyed by prompt and version, and expired ones are deleted on read"""
+
+    clock = _Clock()
+    monkeypatch.setattr(llm_cache.time, 'time', clock)
+
+    llm_cache.set("prompt", "response", "v1")
+
+    assert llm_cache.get("prompt", "v1") == "response"
+    assert llm_cache.get("prompt", "v2") is None
+    assert llm_cache.get("other", "v1") is None
+
+    clock.now += llm_cache.CACHE_TTL + 1
+    assert llm_cache.get("prompt", "v1") is None
+    assert not os.path.exists(llm_cache._cache_path("prompt", "v1"))
+
+def test_ignores_corrupt_entry(cache_dir):
+    """A damaged cache file is a miss, not an error"""
+
+    with open(llm_cache._cache_path("prompt", ""), 'w') as f:
+        f.write('{"response": ')
+
+    assert llm_cache.get("prompt") is None
+
+def test_sweep_drops_expired_and_oldest(cache_dir, monkeypatch):
+    """A sweep deletes expired entries, then the oldest beyond MAX_ENTRIES, and nothing else"""
+
+    monkeypatch.setattr(llm_cache, 'MAX_ENTRIES', 2)
+    monkeypatch.setattr(llm_cache, 'SWEEP_INTERVAL', 10 ** 9)
+    other = cache_dir / "keywords_semantic.jsonl"
+    other.write_text("")
+
+    now = 1_000_000_000.0
+    ages = {"expired": llm_cache.CACHE_TTL + 10, "old": 300, "mid": 200, "new": 100}
+    for prompt, age in ages.items():
+        llm_cache.set(prompt, prompt)
+        os.utime(llm_cache._cache_path(prompt, ""), (now - age, now - age))
+
+    llm_cache._last_sweep = 0.0
+    llm_cache._maybe_sweep(now)
+
+    remaining = {p for p in ages if os.path.exists(llm_cache._cache_path(p, ""))}
+    assert remaining == {"mid", "new"}
+    assert other.exists()
+
+def test_sweep_runs_once_per_interval(cache_dir, monkeypatch):
+    """Writes within SWEEP_INTERVAL of the last sweep do not rescan the directory"""
+
+    monkeypatch.setattr(llm_cache, 'MAX_ENTRIES', 1)
+
+    llm_cache.set("first", "1")
+    llm_cache.set("second", "2")
+
+    assert llm_cache.get("first") == "1"
+    assert llm_cache.get("second") == "2"
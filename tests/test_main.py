@@ -0,0 +1,136 @@
+import sys
+import os
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+# main builds the Gradio UI at import
+pytest.importorskip("gradio")
+
+import main
+from core.implementations import SimpleContentAnalyzer
+from core.interfaces import IKeywordExtractor, ISourceRecommender, ResearchQuery, SearchResult, SearchResultType
+
+class _FlakyExtractor(IKeywordExtractor):
+    """Extractor that answers with defaults until Gemini 'recovers'"""
+
+    def __init__(self):
+        self.down = True
+        self.calls = 0
+
+    def extract_keywords(self, question):
+        self.calls += 1
+        return ["renal"] if self.down else ["osimertinib", "nephritis"]
+
+    def used_fallback(self):
+        return self.down
+
+class _Recommender(ISourceRecommender):
+    def recommend_sources(self, keywords):
+        return ["PubMed"]
+
+def _service():
+    service = main.ResearchAgentService(ai=False)
+    service.keyword_extractor = _FlakyExtractor()
+    service.source_recommender = _Recommender()
+    return service
+
+def test_process_query_does_not_cache_fallbacks():
+    """Answers produced during an outage are recomputed once Gemini is back"""
+
+    service = _service()
+
+    assert service.process_query("Osimertinib nephritis") == (["renal"], ["PubMed"])
+
+    service.keyword_extractor.down = False
+    assert service.process_query("osimertinib  nephritis") == (["osimertinib", "nephritis"], ["PubMed"])
+
+    # The real answer is cached
+    assert service.process_query("OSIMERTINIB nephritis") == (["osimertinib", "nephritis"], ["PubMed"])
+    assert service.keyword_extractor.calls == 2
+
+def _result(title, abstract="EGFR inhibitor nephrotoxicity", **ids):
+    return SearchResult(
+        title=title,
+        authors=["Smith J"],
+        journal="J",
+        publication_date="2024",
+        doi=ids.get("doi"),
+        pmid=ids.get("pmid"),
+        url="",
+        abstract=abstract,
+        result_type=SearchResultType.OTHER,
+        relevance_score=0.0
+    )
+
+class _CountingAnalyzer(SimpleContentAnalyzer):
+    """Analyzer that records how many papers each batch call scored"""
+
+    def __init__(self):
+        self.batches = []
+
+    def analyze_relevance_batch(self, results, query):
+        self.batches.append(len(results))
+        return super().analyze_relevance_batch(results, query)
+
+def test_analyze_results_reuses_cached_analysis():
+    """Papers analyzed for the same keywords, in any order or case, are not scored again"""
+
+    service = main.ResearchAgentService(ai=False)
+    service.content_analyzer = _CountingAnalyzer()
+    papers = [_result("EGFR inhibitor case report"), _result("Renal outcomes", abstract="renal")]
+
+    first = service._analyze_results(papers, ResearchQuery("q", ["EGFR inhibitor", "renal"], ["PubMed"]))
+    second = service._analyze_results(
+        papers + [_result("New systematic review")],
+        ResearchQuery("q", ["Renal", "egfr inhibitor"], ["PubMed"])
+    )
+
+    assert service.content_analyzer.batches == [2, 1]
+    assert second[:2] == first
+    assert [r.result_type for r in second] == [
+        SearchResultType.CASE_REPORT, SearchResultType.OTHER, SearchResultType.SYSTEMATIC_REVIEW
+    ]
+
+    # Different keywords are a different analysis
+    service._analyze_results(papers, ResearchQuery("q", ["kidney"], ["PubMed"]))
+    assert service.content_analyzer.batches == [2, 1, 2]
+
+def test_analyze_results_cache_is_bounded(monkeypatch):
+    """The analysis cache keeps at most ANALYSIS_CACHE_SIZE entries"""
+
+    monkeypatch.setattr(main, 'ANALYSIS_CACHE_SIZE', 3)
+    service = main.ResearchAgentService(ai=False)
+
+    service._analyze_results([_result(f"Paper {n}") for n in range(5)], ResearchQuery("q", ["EGFR"], ["PubMed"]))
+
+    assert len(service._analysis_cache) == 3
+
+def test_iter_unique_drops_shared_identifiers():
+    """Papers sharing a real DOI, PMID or normalized title are reported once"""
+
+    service = main.ResearchAgentService(ai=False)
+    papers = [
+        _result("Osimertinib and the kidney", doi="10.1000/ABC"),
+        _result("Same DOI, other title", doi=" 10.1000/abc "),
+        _result("Acute nephritis", pmid="123"),
+        _result("Same PMID, other title", pmid="123 "),
+        _result("OSIMERTINIB and the kidney!"),
+        _result("Unknown Title"),
+        _result("Unknown Title"),
+    ]
+
+    titles = [r.title for r in service._iter_unique(papers)]
+
+    assert titles == ["Osimertinib and the kidney", "Acute nephritis", "Unknown Title", "Unknown Title"]
+
+def test_iter_unique_ignores_placeholder_identifiers():
+    """Placeholder DOIs and PMIDs do not merge unrelated papers"""
+
+    service = main.ResearchAgentService(ai=False)
+    papers = [
+        _result("First paper", doi="N/A", pmid="N/A"),
+        _result("Second paper", doi="Not available", pmid="Not available"),
+        _result("Third paper", doi="N/A", pmid="N/A"),
+    ]
+
+    assert [r.title for r in service._iter_unique(papers)] == ["First paper", "Second paper", "Third paper"]
@@ -0,0 +1,134 @@
+import sys
+import os
+import io
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import pytest
+from core.pubmed_search import PubMedSearchEngine
+
+def _article(pmid, title, extra=""):
+    return f"""
+<PubmedArticle>
+  <MedlineCitation>
+    <PMID Version="1">{pmid}</PMID>
+    <Article>
+      <Journal>
+        <JournalIssue><PubDate><Year>2023</Year><Month>Mar</Month><Day>15</Day></PubDate></JournalIssue>
+        <Title>Kidney International</Title>
+      </Journal>
+      <ArticleTitle>{title}</ArticleTitle>
+      {extra}
+    </Article>
+  </MedlineCitation>
+  <PubmedData>
+    <ArticleIdList>
+      <ArticleId IdType="pubmed">{pmid}</ArticleId>
+      <ArticleId IdType="doi">10.1000/{pmid}</ArticleId>
+    </ArticleIdList>
+  </PubmedData>
+</PubmedArticle>"""
+
+FULL_ARTICLE = _article("111", "Osimertinib-induced <i>acute</i> glomerulonephritis", """
+      <Abstract>
+        <AbstractText Label="BACKGROUND">EGFR inhibitors can harm the kidney.</AbstractText>
+        <AbstractText Label="CASE">A patient developed <b>nephritis</b>.</AbstractText>
+      </Abstract>
+      <AuthorList>
+        <Author><LastName>Smith</LastName><ForeName>John</ForeName><Initials>J</Initials></Author>
+        <Author><CollectiveName>EGFR Study Group</CollectiveName></Author>
+        <Author><LastName>Doe</LastName></Author>
+        <Author><LastName>Fourth</LastName><Initials>F</Initials></Author>
+      </AuthorList>""")
+
+SPARSE_ARTICLE = """
+<PubmedArticle>
+  <MedlineCitation>
+    <PMID Version="1">222</PMID>
+    <Article>
+      <Journal>
+        <JournalIssue><PubDate><MedlineDate>2021 Jan-Feb</MedlineDate></PubDate></JournalIssue>
+        <Title>Nephron</Title>
+      </Journal>
+      <ArticleTitle>Renal outcomes with erlotinib</ArticleTitle>
+      <ELocationID EIdType="doi">10.2000/erl</ELocationID>
+    </Article>
+  </MedlineCitation>
+</PubmedArticle>"""
+
+def _efetch(*articles):
+    return f'<?xml version="1.0"?><PubmedArticleSet>{"".join(articles)}</PubmedArticleSet>'.encode()
+
+class _Raw(io.BytesIO):
+    """Streamed body with the urllib3 attribute _iter_elements sets"""
+    decode_content = False
+
+class _FakeResponse:
+    def __init__(self, body):
+        self.raw = _Raw(body)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+class _FakeSession:
+    """Session answering efetch POSTs with the articles for the requested ids"""
+
+    def __init__(self, articles):
+        self.articles = articles
+        self.requested = []
+
+    def post(self, url, data=None, **kwargs):
+        ids = data['id'].split(',')
+        self.requested.append(ids)
+        return _FakeResponse(_efetch(*(self.articles[pmid] for pmid in ids if pmid in self.articles)))
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.delenv('NCBI_API_KEY', raising=False)
+    engine = PubMedSearchEngine()
+    engine.rate_limiter.wait = lambda: None
+    engine.session = _FakeSession({
+        "111": FULL_ARTICLE,
+        "222": SPARSE_ARTICLE,
+        "333": _article("333", "Third paper about EGFR"),
+    })
+    return engine
+
+def test_parse_full_article(engine):
+    """Title markup, structured abstracts, authors, date and DOI are all read"""
+
+    result, = engine._fetch_batch_details(["111"])
+
+    assert result.pmid == "111"
+    assert result.title == "Osimertinib-induced acute glomerulonephritis"
+    assert result.abstract == "EGFR inhibitors can harm the kidney. A patient developed nephritis."
+    assert result.authors == ["Smith J", "EGFR Study Group", "Doe"]
+    assert result.journal == "Kidney International"
+    assert result.publication_date == "2023 Mar 15"
+    assert result.doi == "10.1000/111"
+    assert result.url == "https://pubmed.ncbi.nlm.nih.gov/111/"
+
+def test_parse_sparse_article(engine):
+    """Missing abstracts, authors and structured dates fall back sensibly"""
+
+    result, = engine._fetch_batch_details(["222"])
+
+    assert result.abstract == "Renal outcomes with erlotinib"
+    assert result.authors == ["Unknown Author"]
+    assert result.publication_date == "2021 Jan-Feb"
+    assert result.doi == "10.2000/erl"
+
+def test_fetch_details_keeps_order_and_caches(engine):
+    """Results follow esearch order, and cached PMIDs are not fetched again"""
+
+    first = engine._fetch_paper_details(["333", "111", "999"])
+    second = engine._fetch_paper_details(["111", "222", "333"])
+
+    assert [r.pmid for r in first] == ["333", "111"]
+    assert [r.pmid for r in second] == ["111", "222", "333"]
+    assert engine.session.requested == [["333", "111", "999"], ["222"]]
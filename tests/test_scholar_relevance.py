@@ -0,0 +1,86 @@
+import sys
+import os
+import json
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import pytest
+from core import llm_cache
+from core.interfaces import SearchResult, SearchResultType
+from core.scholar_scraper import GoogleScholarScraper
+
+KEYWORDS = ["EGFR", "nephrotoxicity"]
+
+def _result(n):
+    return SearchResult(
+        title=f"EGFR inhibitor nephrotoxicity paper {n}",
+        authors=["Smith J"],
+        journal="J",
+        publication_date="2024",
+        doi=None,
+        pmid=None,
+        url="",
+        abstract="snippet",
+        result_type=SearchResultType.OTHER,
+        relevance_score=0.0
+    )
+
+@pytest.fixture
+def scraper(tmp_path, monkeypatch):
+    """Scraper with AI enabled, an empty LLM cache and a canned Gemini reply"""
+
+    monkeypatch.setenv('GEMINI_API_KEY', 'test-key')
+    monkeypatch.setattr(llm_cache, 'CACHE_DIR', str(tmp_path))
+
+    scraper = GoogleScholarScraper()
+    assert scraper.ai_enabled
+
+    scraper.prompts = []
+    scraper.reply = "[]"
+
+    def generate(prompt, **kwargs):
+        scraper.prompts.append(prompt)
+        return scraper.reply
+
+    scraper.ai_checker._client.generate = generate
+    return scraper
+
+def test_batch_verdicts_map_to_papers(scraper):
+    """Verdicts follow each item's paper number; skipped or out-of-range items keep the default"""
+
+    scraper.reply = json.dumps([
+        {"i": 3, "relevant": False, "score": 10},
+        {"i": 1, "relevant": True, "score": 90},
+        {"i": 7, "relevant": True, "score": 99},
+    ])
+
+    verdicts = scraper._check_relevance_batch([_result(n) for n in range(3)], KEYWORDS)
+
+    assert verdicts == [(True, 0.9), (True, 0.5), (False, 0.1)]
+    assert len(scraper.prompts) == 1
+
+def test_invalid_reply_keeps_every_paper(scraper):
+    """A reply that is not JSON falls back to including every paper"""
+
+    scraper.reply = "not json"
+
+    assert scraper._check_relevance_batch([_result(n) for n in range(2)], KEYWORDS) == [(True, 0.5)] * 2
+
+def test_filter_reuses_cached_verdicts(scraper):
+    """Papers scored once are served from the cache; results are sorted and rejects dropped"""
+
+    results = [_result(n) for n in range(3)]
+    scraper.reply = json.dumps([
+        {"i": 1, "relevant": True, "score": 60},
+        {"i": 2, "relevant": False, "score": 20},
+        {"i": 3, "relevant": True, "score": 80},
+    ])
+
+    first = scraper._filter_relevant_papers(results, KEYWORDS)
+    second = scraper._filter_relevant_papers(results, KEYWORDS)
+
+    assert [(r.title, r.relevance_score) for r in first] == [
+        ("EGFR inhibitor nephrotoxicity paper 2", 0.8),
+        ("EGFR inhibitor nephrotoxicity paper 0", 0.6),
+    ]
+    assert second == first
+    assert len(scraper.prompts) == 1
@@ -0,0 +1,117 @@
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core import llm_cache, semantic_cache
+from core.ai_implementations import GeminiKeywordExtractor
+from core.semantic_cache import SemanticCache
+
+class _Clock:
+    """Stand-in for time.time that tests can move forward"""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def _cache(path, **kwargs):
+    """SemanticCache whose embeddings put questions starting with the same letter together"""
+
+    cache = SemanticCache("test-key", str(path), session=None, **kwargs)
+    cache._embed = lambda text: [1.0, 0.0] if text.startswith('a') else [0.0, 1.0]
+    return cache
+
+def test_matches_paraphrases(tmp_path):
+    """Exact repeats and similar questions hit; dissimilar ones miss"""
+
+    cache = _cache(tmp_path / "semantic.jsonl")
+    cache.put("About EGFR", ["EGFR"])
+
+    assert cache.get("  about   egfr ") == ["EGFR"]
+    assert cache.get("another EGFR question") == ["EGFR"]
+    assert cache.get("kidney question") is None
+
+def test_expiry(tmp_path, monkeypatch):
+    """Expired entries are dropped in memory and on reload"""
+
+    clock = _Clock()
+    monkeypatch.setattr(semantic_cache.time, 'time', clock)
+    path = tmp_path / "semantic.jsonl"
+
+    cache = _cache(path, ttl=100)
+    cache.put("a first", 1)
+    clock.now += 60
+    cache.put("b second", 2)
+
+    clock.now += 50
+    assert cache.get("a first") is None
+    assert cache.get("b second") == 2
+    assert _cache(path, ttl=100)._texts == ["b second"]
+
+    clock.now += 100
+    assert _cache(path, ttl=100).get("b second") is None
+
+def test_evicts_oldest(tmp_path):
+    """Past max_entries the oldest questions go first"""
+
+    cache = _cache(tmp_path / "semantic.jsonl", max_entries=2)
+    for text in ("a1", "b2", "a3"):
+        cache.put(text, text)
+
+    assert cache._texts == ["b2", "a3"]
+    assert cache.get("b2") == "b2"
+    assert cache.get("a3") == "a3"
+
+def test_put_appends_one_line(tmp_path):
+    """Each new question adds one line instead of rewriting the file"""
+
+    path = tmp_path / "semantic.jsonl"
+    cache = _cache(path)
+
+    cache.put("a first", 1)
+    first_line = path.read_bytes()
+    cache.put("b second", 2)
+
+    content = path.read_bytes()
+    assert content.startswith(first_line)
+    assert content.count(b"\n") == 2
+
+def test_compacts_and_survives_torn_lines(tmp_path):
+    """Evicted entries are compacted away, and a partial last line is skipped on load"""
+
+    path = tmp_path / "semantic.jsonl"
+    cache = _cache(path, max_entries=2)
+    for n in range(150):
+        cache.put(f"a{n}", n)
+
+    assert len(path.read_bytes().splitlines()) < 150
+
+    with open(path, 'ab') as f:
+        f.write(b'{"text": "a-torn", "vec')
+
+    reloaded = _cache(path, max_entries=2)
+    assert reloaded._texts == ["a148", "a149"]
+    assert reloaded.get("a149") == 149
+
+class _FakeClient:
+    def __init__(self):
+        self.prompts = []
+
+    def generate(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return "osimertinib, nephrotoxicity" if "osimertinib" in prompt.lower() else "erlotinib, nephrotoxicity"
+
+def test_keyword_hits_require_same_drugs(tmp_path, monkeypatch):
+    """A similar question naming a different drug does not reuse cached keywords"""
+
+    monkeypatch.setattr(llm_cache, 'CACHE_DIR', str(tmp_path))
+    extractor = GeminiKeywordExtractor(api_key="test-key")
+    extractor._client = _FakeClient()
+    # Every question embeds identically, so only the term check tells them apart
+    extractor.semantic_cache._embed = lambda text: [1.0, 0.0]
+
+    assert extractor.extract_keywords("Osimertinib kidney toxicity?") == ["osimertinib", "nephrotoxicity"]
+    assert extractor.extract_keywords("Kidney toxicity of osimertinib") == ["osimertinib", "nephrotoxicity"]
+    assert extractor.extract_keywords("Erlotinib kidney toxicity?") == ["erlotinib", "nephrotoxicity"]
+    assert len(extractor._client.prompts) == 2